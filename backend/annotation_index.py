@@ -0,0 +1,173 @@
+# backend/annotation_index.py
+import json
+import os
+import sqlite3
+import threading
+
+from .config import ProjectConfig
+from .exporter import load_voc_xml, load_yolo
+
+def words_of(text):
+    return text.split()
+
+class AnnotationIndex:
+    """
+    Project-wide index of saved annotations, stored in SQLite next to the OCR
+    cache. Each page is one row keyed by its image file name, so re-opening a
+    page is a single lookup instead of an XML parse, and a (word, page) table
+    answers "which pages contain X" from its primary key.
+    Safe to share between threads.
+    """
+    SYNC_BATCH = 500 # Pages written per transaction by sync()
+
+    def __init__(self, path=ProjectConfig.INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pages ("
+                               "name TEXT PRIMARY KEY, width INTEGER NOT NULL, height INTEGER NOT NULL, "
+                               "source TEXT, source_mtime REAL, boxes TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS words ("
+                               "word TEXT NOT NULL, page TEXT NOT NULL, count INTEGER NOT NULL, "
+                               "PRIMARY KEY (word, page)) WITHOUT ROWID")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS words_page ON words (page)")
+
+    def put_page(self, name, image_size, boxes, source=None, source_mtime=None):
+        """
+        Stores (or replaces) a page's boxes, [{'bbox': [...], 'text': str}, ...].
+        source/source_mtime: file name and mtime of the XML the boxes were saved
+        to, so sync() and load_annotations() can tell when the entry is stale.
+        """
+        self.put_pages([(name, image_size, boxes, source, source_mtime)])
+
+    def put_pages(self, pages):
+        """put_page for many (name, image_size, boxes, source, source_mtime) at once, in one transaction"""
+        page_rows, word_rows = [], []
+        for name, image_size, boxes, source, source_mtime in pages:
+            rows = [[*(round(v, 2) for v in b['bbox']), b.get('text', '')] for b in boxes]
+            page_rows.append((name, int(image_size[0]), int(image_size[1]), source, source_mtime,
+                              json.dumps(rows, ensure_ascii=False, separators=(',', ':'))))
+            counts = {}
+            for b in boxes:
+                for word in words_of(b.get('text', '')):
+                    counts[word] = counts.get(word, 0) + 1
+            word_rows.extend((w, name, c) for w, c in counts.items())
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM words WHERE page = ?", [(r[0],) for r in page_rows])
+            self._conn.executemany("INSERT OR REPLACE INTO pages (name, width, height, source, source_mtime, boxes) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", page_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO words (word, page, count) VALUES (?, ?, ?)", word_rows)
+
+    def record_save(self, image_path, image_size, boxes, xml_path):
+        """Indexes a page right after its labels were written to xml_path"""
+        self.put_page(os.path.basename(image_path), image_size, boxes,
+                      source=os.path.basename(xml_path), source_mtime=os.path.getmtime(xml_path))
+
+    def get_page(self, name):
+        """Returns {'size': (w, h), 'source_mtime': float, 'boxes': [...]} or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT width, height, source_mtime, boxes FROM pages WHERE name = ?",
+                                     (name,)).fetchone()
+        if row is None:
+            return None
+        width, height, source_mtime, rows = row
+        boxes = [{'bbox': r[:4], 'text': r[4]} for r in json.loads(rows)]
+        return {'size': (width, height), 'source_mtime': source_mtime, 'boxes': boxes}
+
+    def remove_page(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE name = ?", (name,))
+            self._conn.execute("DELETE FROM words WHERE page = ?", (name,))
+
+    def sources(self):
+        """{XML file name: (page name, source_mtime)} for pages indexed from an XML"""
+        with self._lock:
+            rows = self._conn.execute("SELECT source, name, source_mtime FROM pages "
+                                      "WHERE source IS NOT NULL").fetchall()
+        return {source: (name, mtime) for source, name, mtime in rows}
+
+    def pages_with_word(self, word, prefix=False, limit=None):
+        """
+        Pages containing `word` (or any word starting with it), most
+        occurrences first. Returns [(page name, count), ...].
+        """
+        if prefix:
+            # A range over the primary key, so still an index seek
+            where, params = "word >= ? AND word < ?", (word, word + "\U0010ffff")
+        else:
+            where, params = "word = ?", (word,)
+        sql = f"SELECT page, SUM(count) AS n FROM words WHERE {where} GROUP BY page ORDER BY n DESC, page"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def sync(self, project_dir="."):
+        """
+        Brings the index up to date with project_dir/xml_labels: (re)indexes
+        XML files that are new or changed since they were indexed and drops
+        pages whose XML is gone. Unchanged files are only stat'ed, not parsed.
+        Returns (updated, removed) counts.
+        """
+        xml_dir = os.path.join(project_dir, "xml_labels")
+        names = sorted(n for n in os.listdir(xml_dir) if n.lower().endswith(".xml")) if os.path.isdir(xml_dir) else []
+        indexed = self.sources()
+
+        updated, batch = 0, []
+        for n in names:
+            xml_path = os.path.join(xml_dir, n)
+            mtime = os.path.getmtime(xml_path)
+            if n in indexed and indexed[n][1] == mtime:
+                continue
+            image_filename, size, boxes = load_voc_xml(xml_path)
+            batch.append((image_filename or os.path.splitext(n)[0], size, boxes, n, mtime))
+            if len(batch) >= self.SYNC_BATCH:
+                self.put_pages(batch)
+                updated += len(batch)
+                batch = []
+        self.put_pages(batch)
+        updated += len(batch)
+
+        gone = set(indexed) - set(names)
+        for n in gone:
+            self.remove_page(indexed[n][0])
+        return updated, len(gone)
+
+    def stats(self):
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            words, distinct = self._conn.execute("SELECT COALESCE(SUM(count), 0), COUNT(DISTINCT word) FROM words").fetchone()
+        return {'path': self.path, 'pages': pages, 'words': words, 'distinct_words': distinct}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def load_annotations(index, image_path, image_size, project_dir="."):
+    """
+    Saved boxes for an image, [{'bbox': [...], 'text': str}, ...], or None.
+    Uses the index while its entry is as new as the XML, otherwise parses the
+    XML (and re-indexes it), and falls back to the text-less YOLO labels.
+    """
+    from .pipeline import label_paths
+
+    name = os.path.basename(image_path)
+    yolo_path, xml_path = label_paths(project_dir, image_path)
+    xml_mtime = os.path.getmtime(xml_path) if os.path.exists(xml_path) else None
+
+    entry = index.get_page(name) if index is not None else None
+    if entry is not None and (xml_mtime is None or entry['source_mtime'] == xml_mtime):
+        return entry['boxes']
+    if xml_mtime is not None:
+        _, _, boxes = load_voc_xml(xml_path)
+        if index is not None:
+            index.put_page(name, image_size, boxes, source=os.path.basename(xml_path), source_mtime=xml_mtime)
+        return boxes
+    if os.path.exists(yolo_path):
+        return load_yolo(yolo_path, image_size[0], image_size[1])
+    return None
@@ -0,0 +1,164 @@
+# backend/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .config import ProjectConfig
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def make_key(image_hash, yolo_hash, crnn_hash, options):
+    """Cache key for one page under one model/threshold configuration"""
+    payload = json.dumps([image_hash, yolo_hash, crnn_hash, options], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResultCache:
+    """
+    On-disk LRU cache of OCREngine.run results, stored in SQLite.
+    Safe to share between threads.
+    """
+    def __init__(self, path=ProjectConfig.CACHE_PATH, max_entries=ProjectConfig.CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                               "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_lru ON results (last_access)")
+
+    def get(self, key):
+        """Returns the cached results, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, results):
+        """Stores results, evicting the least recently used entries over max_entries"""
+        value = json.dumps(results, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO results (key, value, last_access) VALUES (?, ?, ?)",
+                               (key, value, time.time()))
+            count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM results WHERE key IN "
+                                   "(SELECT key FROM results ORDER BY last_access LIMIT ?)",
+                                   (count - self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM results").fetchone()
+        return {'path': self.path, 'entries': entries, 'bytes': size, 'max_entries': self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM results")
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class CropCache:
+    """
+    In-memory LRU of CRNN texts keyed by crop content, so words that repeat
+    across pages (form labels, headers, stamps) are read once.
+    'exact' keys hash the crop as the CRNN sees it, quantized back to 8 bits.
+    'perceptual' keys hash a difference hash over PERCEPTUAL_CELL-pixel cells,
+    so slightly different scans of the same printed word match too, at the
+    risk of merging lookalike words. Safe to share between threads.
+    Only valid for one CRNN: clear() it when the model changes.
+    """
+    MODES = ('exact', 'perceptual')
+    PERCEPTUAL_CELL = 2
+
+    def __init__(self, max_entries=ProjectConfig.CROP_CACHE_MAX_ENTRIES, mode='exact'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown crop cache mode {mode!r}, expected one of {self.MODES}")
+        self.max_entries = max_entries
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def keys(self, batch):
+        """One bytes key per crop of a normalized (N, 3, H, W) CRNN input"""
+        import numpy as np
+        import torch
+
+        n, _, h, w = batch.shape
+        if self.mode == 'exact':
+            rows = ((batch.detach().cpu() + 1) * 127.5).round().clamp(0, 255).to(torch.uint8)
+        else:
+            gray = batch.detach().cpu().float().mean(dim=1, keepdim=True)
+            cell = self.PERCEPTUAL_CELL
+            grid = torch.nn.functional.adaptive_avg_pool2d(gray, (max(h // cell, 1), max(w // cell, 1) + 1))
+            rows = (grid[..., 1:] > grid[..., :-1]).flatten(1)
+            rows = torch.from_numpy(np.packbits(rows.numpy(), axis=1))
+        rows = rows.reshape(n, -1).numpy()
+        prefix = f"{self.mode}:{h}x{w}:".encode()
+        return [prefix + hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in rows]
+
+    def lookup(self, keys):
+        """
+        Looks up a batch of keys. Returns (texts, unseen): texts has None for
+        every crop still to be read, unseen maps each distinct missing key to
+        the positions sharing it. Repeats of a missing key count as hits,
+        since only its first occurrence is read.
+        """
+        texts = [None] * len(keys)
+        unseen = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in unseen:
+                    unseen[key].append(i)
+                    self.hits += 1
+                    continue
+                text = self._entries.get(key)
+                if text is None:
+                    unseen[key] = [i]
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    texts[i] = text
+                    self.hits += 1
+        return texts, unseen
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'mode': self.mode, 'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,126 @@
+# backend/calibration.py
+"""
+One-time CRNN batch-size calibration. Times the loaded CRNN on synthetic
+batches of increasing size and measures how much memory a crop costs in
+flight, then saves the fastest batch size that fits the batch budget.
+OCREngine picks the saved entry up when it loads a CRNN on the same
+machine with the same weights and settings.
+"""
+import json
+import os
+import platform
+import time
+
+from .config import ModelConfig
+from .metrics import peak_rss_mb, reset_peak_rss, rss_mb
+
+BATCH_SIZES = (8, 16, 32, 64, 128, 256, 512, 1024)
+# Batch sizes this close to the fastest count as just as fast; the smallest wins
+THROUGHPUT_TOLERANCE = 0.03
+
+def calibration_key(engine):
+    """What a calibration is valid for: this machine, these weights, these settings"""
+    import torch
+    return json.dumps({
+        'host': platform.node(),
+        'cpus': os.cpu_count(),
+        'device': engine.device,
+        'threads': torch.get_num_threads(),
+        'crnn': engine._weights_hash(engine.crnn_path) if engine.crnn_path else None,
+        'backend': type(engine.crnn_model).__name__,
+        'fast_cpu': engine.fast_cpu,
+        'img_height': ModelConfig.IMG_HEIGHT,
+    }, sort_keys=True)
+
+def load_calibration(path, key):
+    """The saved entry for key, or None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get(key)
+    except (OSError, ValueError):
+        return None
+
+def save_calibration(path, key, entry):
+    """Adds/replaces key's entry; entries of other machines and models are kept"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries[key] = entry
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _measure(engine, batch, repeats):
+    """(seconds per forward, MB above the baseline at the peak) of the CRNN on batch"""
+    import torch
+
+    cuda = engine.device == 'cuda'
+    with torch.no_grad():
+        engine.crnn_model(batch.to(engine.device)) # Warm-up, and lets the allocator settle
+        if cuda:
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            base = torch.cuda.memory_allocated()
+        else:
+            base = rss_mb()
+            reset_peak_rss()
+
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.crnn_model(batch.to(engine.device))
+            if cuda:
+                torch.cuda.synchronize()
+            times.append(time.perf_counter() - start)
+
+    if cuda:
+        peak = (torch.cuda.max_memory_allocated() - base) / (1024 * 1024)
+    else:
+        peak = peak_rss_mb() - base if base is not None else None
+    return min(times), peak
+
+def calibrate_crnn(engine, batch_budget_mb=None, batch_sizes=BATCH_SIZES, repeats=3, on_result=None):
+    """
+    Times the engine's CRNN at each batch size (at IMG_WIDTH) that fits the
+    batch budget (crnn_batch_budget_mb). Returns the entry to save:
+    {'batch_size', 'crops_per_sec', 'activation_bytes_per_pixel', 'results': [...]}.
+    on_result(batch_size, crops_per_sec, peak_mb) is called after each size.
+    """
+    import torch
+
+    budget_mb = batch_budget_mb or engine.crnn_batch_budget_mb
+    height, width = ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH
+    # Until measured, sizes are bounded by the configured estimate
+    per_pixel = ModelConfig.CRNN_ACTIVATION_BYTES_PER_PIXEL
+
+    results = []
+    for size in sorted(batch_sizes):
+        if engine.crop_bytes(width, per_pixel) * size > budget_mb * 1024 * 1024:
+            break
+        batch = torch.rand(size, 3, height, width) * 2 - 1
+        seconds, peak = _measure(engine, batch, repeats)
+        results.append({'batch_size': size, 'crops_per_sec': size / seconds, 'peak_mb': peak})
+        if on_result:
+            on_result(size, size / seconds, peak)
+        if peak is not None and peak > 0 and size >= 32:
+            # Big enough batches give a stable per-crop figure; small ones sit in the allocator's slack
+            per_pixel = peak * 1024 * 1024 / (size * height * width)
+
+    if not results:
+        raise ValueError(f"Not even a batch of {min(batch_sizes)} crops fits in {budget_mb} MB")
+    best = max(r['crops_per_sec'] for r in results)
+    chosen = min((r for r in results if r['crops_per_sec'] >= best * (1 - THROUGHPUT_TOLERANCE)),
+                 key=lambda r: r['batch_size'])
+    return {
+        'batch_size': chosen['batch_size'],
+        'crops_per_sec': chosen['crops_per_sec'],
+        'activation_bytes_per_pixel': per_pixel,
+        'batch_budget_mb': budget_mb,
+        'calibrated': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'results': results,
+    }
@@ -3,6 +3,64 @@
 class ModelConfig:
     IMG_HEIGHT = 40
     IMG_WIDTH = 64
+    # Widths available to the variable-width CRNN mode. Each crop is resized
+    # to IMG_HEIGHT and padded up to the smallest bucket that fits it. Crops
+    # wider than IMG_WIDTH get exactly the fixed-mode treatment (scaled down
+    # to fit 64px): the CRNN was trained on such crops, and a wider bucket
+    # would cost more pixels than fixed mode. So no crop costs more than it
+    # would there, and 24px still leaves the CRNN 5 CTC steps.
+    WIDTH_BUCKETS = (24, 32, 48, 64)
+    # Crops pooled per CRNN forward pass (across pages when batching), unless
+    # a calibration (cli.py calibrate) found a faster size for this machine
+    CRNN_BATCH_SIZE = 128
+    # Memory for the crops and CRNN activations of one micro-batch; caps the
+    # batch size. Not a cap on the process: the decoded page comes on top
+    CRNN_BATCH_BUDGET_MB = 512
+    # Peak forward-pass memory per input pixel of a crop, until calibrated
+    # (measured for the reference CRNN, float32 on CPU: ~1.25 MB per 40x64 crop)
+    CRNN_ACTIVATION_BYTES_PER_PIXEL = 512
+    # Pages sent to YOLO per predict call by the headless pipeline
+    YOLO_BATCH_SIZE = 8
+
+    # Detection thresholds (ultralytics defaults)
+    YOLO_CONF = 0.25
+    YOLO_IOU = 0.7
+    YOLO_MAX_DET = 300
+    # Pre-NMS candidates kept per page so new thresholds re-filter without
+    # re-running YOLO; thresholds below YOLO_CANDIDATE_CONF re-detect
+    YOLO_CANDIDATE_CONF = 0.05
+    YOLO_MAX_CANDIDATES = 30000
+    DETECTION_CACHE_PAGES = 16
+    # Input size for ONNX detectors that don't record one
+    YOLO_IMGSZ = 640
+
+    # Tiled mode for very large scans: tiles are fed to YOLO at native
+    # resolution, so TILE_SIZE matches the detector input size
+    TILE_SIZE = 640
+    # Must be wider than the largest word so every word is whole in some tile
+    TILE_OVERLAP = 160
+    # Boxes this close to an inner tile edge are treated as cut by the seam
+    TILE_SEAM_MARGIN = 2
+    # Memory for the tile tensors in flight. Not a cap on the process: PIL
+    # still decodes the whole page once at 8 bits (3 bytes per pixel) first
+    TILE_BATCH_BUDGET_MB = 1024
+
+    # ONNX Runtime / torch CPU threads (0 = library default)
+    INTRA_OP_THREADS = 0
+    INTER_OP_THREADS = 0
+
+class ProjectConfig:
+    # Paths are relative to the project directory (the working directory for the GUI)
+    CACHE_PATH = "data/ocr_cache.sqlite"
+    CACHE_MAX_ENTRIES = 10000
+    # Distinct word crops whose CRNN text is kept in memory (backend.cache.CropCache)
+    CROP_CACHE_MAX_ENTRIES = 50000
+    # Per-machine CRNN batch sizes found by `cli.py calibrate`
+    CALIBRATION_PATH = "data/crnn_calibration.json"
+    # Every saved page's boxes and text, for instant re-opening and word search
+    INDEX_PATH = "data/annotations.sqlite"
+    # Boxes overlapping another one by more than this IoU are flagged as likely duplicates
+    DUPLICATE_IOU = 0.5
 
 # Extracted from crnn_inference_old.py
 CHAR_LIST = [
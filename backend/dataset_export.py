@@ -0,0 +1,207 @@
+# backend/dataset_export.py
+"""
+Turns an annotated project into sharded tar archives of word crops for CRNN
+training. Each word becomes three tar members sharing a key, the layout
+webdataset-style loaders expect:
+    <key>.png    the crop (optionally resized to a fixed height)
+    <key>.txt    its text label, UTF-8
+    <key>.json   {"page": image filename, "index": word index, "bbox": [x1, y1, x2, y2]}
+Keys are <page>_<index> with every character of the page's file name other
+than letters, digits, '-' and '_' replaced by '_', since loaders split a
+member name into key and extension at its first dot. Pages' XML files are
+parsed and cropped in a process pool and written to disk shard by shard as
+results arrive, so memory stays flat however large the project is.
+"""
+import io
+import json
+import os
+import re
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .exporter import load_voc_xml
+
+SHARD_PATTERN = "words-{:06d}.tar"
+
+def find_annotated_pages(project_dir):
+    """
+    Every xml_labels/*.xml in the project, sorted. They are only listed here:
+    the export workers parse them and look up their images.
+    """
+    xml_dir = os.path.join(project_dir, "xml_labels")
+    return [os.path.join(xml_dir, name) for name in sorted(os.listdir(xml_dir))
+            if name.lower().endswith(".xml")]
+
+def sample_key(image_filename, index):
+    """Tar key of a page's word: no dots, so loaders can't split it into key and extension"""
+    return f"{re.sub(r'[^A-Za-z0-9_-]', '_', image_filename)}_{index:04d}"
+
+def crop_words(image, boxes, height=None, min_size=2):
+    """
+    Cuts each box out of a decoded page, clipped to the page.
+    With height set, crops are resized to it keeping their aspect ratio.
+    Returns [(index, crop, text), ...] for the boxes that are not degenerate.
+    """
+    from PIL import Image
+
+    samples = []
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = box['bbox']
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(image.width, int(x2)), min(image.height, int(y2))
+        if x2 - x1 < min_size or y2 - y1 < min_size:
+            continue
+        crop = image.crop((x1, y1, x2, y2))
+        if height:
+            width = max(1, round((x2 - x1) * height / (y2 - y1)))
+            crop = crop.resize((width, height), Image.Resampling.LANCZOS)
+        samples.append((i, crop, box.get('text', '')))
+    return samples
+
+def _crop_page(task):
+    """
+    Process-pool entry point: one page's XML in, (image_path, encoded samples)
+    out. Samples are None when the page's image is missing.
+    """
+    xml_path, image_dir, height, image_format = task
+    from PIL import Image
+
+    image_filename, _, boxes = load_voc_xml(xml_path)
+    image_path = os.path.join(image_dir, image_filename)
+    if not os.path.exists(image_path):
+        return image_path, None
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        encoded = []
+        for i, crop, text in crop_words(image, boxes, height):
+            buf = io.BytesIO()
+            crop.save(buf, format=image_format)
+            meta = {'page': image_filename, 'index': i, 'bbox': boxes[i]['bbox']}
+            encoded.append((sample_key(image_filename, i), buf.getvalue(), text, meta))
+    return image_path, encoded
+
+class ShardWriter:
+    """Writes samples into numbered tar shards of at most shard_size samples each"""
+    def __init__(self, output_dir, shard_size=10000, extension="png"):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        self.extension = extension
+        self.shards = [] # Finished shard paths
+        self._tar = None
+        self._tmp_path = None
+        self._count = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data) # mtime stays 0 so shards are reproducible
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def write(self, key, image_bytes, text, meta):
+        if self._tar is None:
+            path = os.path.join(self.output_dir, SHARD_PATTERN.format(len(self.shards)))
+            # Written under a temporary name so a crash never leaves a truncated shard behind
+            self._tmp_path = path + ".tmp"
+            self._tar = tarfile.open(self._tmp_path, "w")
+        self._add(f"{key}.{self.extension}", image_bytes)
+        self._add(f"{key}.txt", text.encode("utf-8"))
+        self._add(f"{key}.json", json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        self._count += 1
+        if self._count >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """Closes the current shard, if any"""
+        if self._tar is None:
+            return
+        self._tar.close()
+        path = self._tmp_path[:-len(".tmp")]
+        os.replace(self._tmp_path, path)
+        self.shards.append(path)
+        self._tar = None
+        self._count = 0
+
+    def close(self):
+        self.flush()
+
+def export_word_shards(xml_paths, image_dir, output_dir, shard_size=10000, height=None, image_format="PNG",
+                       workers=None, on_page=None):
+    """
+    Crops every word of every page (an XML file of find_annotated_pages and
+    its image in image_dir) into tar shards in output_dir, with a process
+    pool doing the parsing, decoding, cropping and encoding. Only a few pages
+    per worker are in flight at once, and shards are filled in page order,
+    so the output is the same for any worker count.
+    on_page: optional callback(image_path, num_words).
+    Returns a stats dict, also saved as output_dir/manifest.json; pages whose
+    image is missing are listed in its 'missing' (XML paths).
+    """
+    extension = image_format.lower().replace("jpeg", "jpg")
+    writer = ShardWriter(output_dir, shard_size, extension)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(xml_path, image_dir, height, image_format) for xml_path in xml_paths]
+
+    num_words, errors, missing = 0, [], []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = workers * 4
+        futures = [pool.submit(_crop_page, t) for t in tasks[:window]]
+        next_task = len(futures)
+        for i in range(len(tasks)):
+            future = futures[i]
+            futures[i] = None # Let finished results be freed
+            if next_task < len(tasks):
+                futures.append(pool.submit(_crop_page, tasks[next_task]))
+                next_task += 1
+            try:
+                image_path, samples = future.result()
+            except Exception as e:
+                errors.append((tasks[i][0], str(e)))
+                continue
+            if samples is None:
+                missing.append(tasks[i][0])
+                continue
+            for key, image_bytes, text, meta in samples:
+                writer.write(key, image_bytes, text, meta)
+            num_words += len(samples)
+            if on_page:
+                on_page(image_path, len(samples))
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        'pages': len(xml_paths) - len(missing),
+        'words': num_words,
+        'shards': [os.path.basename(p) for p in writer.shards],
+        'shard_size': shard_size,
+        'height': height,
+        'format': extension,
+        'errors': errors,
+        'missing': missing,
+        'seconds': elapsed,
+        'words_per_sec': num_words / elapsed if elapsed > 0 else 0.0,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    return stats
+
+def iter_shard(path):
+    """Yields (key, image_bytes, text, meta) from a shard, e.g. for a training Dataset"""
+    with tarfile.open(path, "r") as tar:
+        key, sample = None, {}
+        for member in tar:
+            # The key is everything before the first dot, as webdataset loaders split it
+            member_key, _, ext = member.name.partition(".")
+            if member_key != key and sample:
+                yield _sample(key, sample)
+                sample = {}
+            key = member_key
+            sample[ext] = tar.extractfile(member).read()
+        if sample:
+            yield _sample(key, sample)
+
+def _sample(key, sample):
+    meta = json.loads(sample['json']) if 'json' in sample else {}
+    image = next(data for ext, data in sample.items() if ext not in ("txt", "json"))
+    return key, image, sample.get('txt', b'').decode("utf-8"), meta
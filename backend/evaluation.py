@@ -0,0 +1,93 @@
+# backend/evaluation.py
+import os
+import time
+
+import torch
+from PIL import Image
+
+from .config import ModelConfig
+from .pipeline import IMAGE_EXTENSIONS
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+def character_error_rate(predictions, references):
+    """Total edit distance divided by total reference length"""
+    errors = sum(edit_distance(p, r) for p, r in zip(predictions, references))
+    total = sum(len(r) for r in references)
+    return errors / max(total, 1)
+
+def load_labeled_crops(folder):
+    """
+    Reads a folder of word crops with their ground truth.
+    Labels come from labels.txt ("<filename>\\t<text>" per line) when present,
+    otherwise from a <name>.txt file next to each <name>.png/.jpg.
+    Returns [(image path, text), ...].
+    """
+    labels_file = os.path.join(folder, "labels.txt")
+    samples = []
+    if os.path.exists(labels_file):
+        with open(labels_file, encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                name, _, text = line.partition("\t")
+                samples.append((os.path.join(folder, name), text))
+        return samples
+
+    for name in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(name)
+        txt = os.path.join(folder, stem + ".txt")
+        if ext.lower() in IMAGE_EXTENSIONS and os.path.exists(txt):
+            with open(txt, encoding="utf-8") as f:
+                samples.append((os.path.join(folder, name), f.read().strip()))
+    return samples
+
+def recognize_crops(engine, model, paths, batch_size=ModelConfig.CRNN_BATCH_SIZE):
+    """Runs a CRNN over crop files with the reference PIL preprocessing. Returns (texts, seconds)"""
+    texts = []
+    elapsed = 0.0
+    for start in range(0, len(paths), batch_size):
+        batch = torch.stack([engine.transform(Image.open(p).convert("RGB"))
+                             for p in paths[start:start + batch_size]])
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            preds = model(batch)
+        elapsed += time.perf_counter() - t0
+        texts.extend(engine.decode_predictions(preds))
+    return texts, elapsed
+
+def compare_models(engine, reference_model, candidate_model, samples):
+    """
+    Scores two CRNNs on the same labeled crops.
+    Returns CER of each against the labels, CER of the candidate against the
+    reference's output, and forward-pass time of each after a warm-up batch.
+    """
+    paths = [p for p, _ in samples]
+    labels = [t for _, t in samples]
+
+    # One untimed batch each first, so neither is charged for one-time setup
+    # (allocator growth, quantized weight packing, thread pool start-up)
+    for model in (reference_model, candidate_model):
+        recognize_crops(engine, model, paths[:ModelConfig.CRNN_BATCH_SIZE])
+    ref_texts, ref_time = recognize_crops(engine, reference_model, paths)
+    cand_texts, cand_time = recognize_crops(engine, candidate_model, paths)
+
+    return {
+        'samples': len(samples),
+        'reference_cer': character_error_rate(ref_texts, labels),
+        'candidate_cer': character_error_rate(cand_texts, labels),
+        'disagreement_cer': character_error_rate(cand_texts, ref_texts),
+        'reference_seconds': ref_time,
+        'candidate_seconds': cand_time,
+    }
@@ -61,4 +61,43 @@ def save_to_voc_xml(boxes, image_filename, image_size, output_path):
     final_xml = f"<?xml version='1.0' encoding='utf-8'?>\n{xml_str}"
     
     with open(output_path, "w", encoding="utf-8") as f:
-        f.write(final_xml)
\ No newline at end of file
+        f.write(final_xml)
+
+def load_voc_xml(xml_path):
+    """
+    Reads a file written by save_to_voc_xml back.
+    Returns (image_filename, (width, height), boxes) with boxes as
+    [{'bbox': [x1, y1, x2, y2], 'text': str}, ...] in reading order.
+    """
+    root = ET.parse(xml_path).getroot()
+    image_filename = root.findtext("image", "")
+    image_size = (int(root.findtext("width", "0")), int(root.findtext("height", "0")))
+
+    boxes = []
+    for word in root.iter("word"):
+        bbox = word.find("bbox")
+        if bbox is None:
+            continue
+        boxes.append({
+            'bbox': [int(bbox.get(k)) for k in ("x1", "y1", "x2", "y2")],
+            'text': word.findtext("text", "") or "",
+        })
+    return image_filename, image_size, boxes
+
+
+def load_yolo(txt_path, image_width, image_height):
+    """
+    Reads a file written by save_to_yolo back. YOLO labels carry no text,
+    so every box comes back with text ''.
+    """
+    boxes = []
+    with open(txt_path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            x_c, y_c, w, h = (float(v) for v in parts[1:])
+            x_c, w = x_c * image_width, w * image_width
+            y_c, h = y_c * image_height, h * image_height
+            boxes.append({'bbox': [x_c - w / 2, y_c - h / 2, x_c + w / 2, y_c + h / 2], 'text': ''})
+    return boxes
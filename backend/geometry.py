@@ -1,4 +1,5 @@
 # backend/geometry.py
+import numpy as np
 
 def sort_boxes_into_lines(boxes):
     """
@@ -57,4 +58,37 @@ def sort_boxes_into_lines(boxes):
     current_line.sort(key=get_center_x)
     lines.append(current_line)
 
-    return lines
\ No newline at end of file
+    return lines
+
+def nms(boxes, scores, iou_threshold):
+    """
+    Greedy non-maximum suppression.
+    Args:
+        boxes (np.ndarray): (N, 4) array of [x1, y1, x2, y2]
+        scores (np.ndarray): (N,) confidence per box
+        iou_threshold (float): boxes overlapping a kept box by more are dropped
+    Returns:
+        np.ndarray: indices of the kept boxes, highest score first.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(min=0) * (y2 - y1).clip(min=0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        # Intersection of the best box with all remaining ones
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(min=0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(min=0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
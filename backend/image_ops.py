@@ -1,4 +1,7 @@
 # backend/image_ops.py
+import numpy as np
+import torch
+import torch.nn.functional as F
 from PIL import Image
 
 class ResizeAndPad:
@@ -27,4 +30,90 @@ class ResizeAndPad:
             paste_x = (self.width - new_width) // 2
             new_img.paste(img, (paste_x, 0))
             
-        return new_img
\ No newline at end of file
+        return new_img
+
+# Most bilinear taps per output pixel and axis when shrinking a crop; beyond
+# this, pixels of very large crops are skipped rather than averaged
+MAX_SAMPLING_TAPS = 8
+
+def page_to_tensor(image):
+    """
+    Converts a decoded RGB PIL page to a (1, 3, H, W) float tensor in [0, 255].
+    The tensor is a channels-last view over one float copy of the page.
+    """
+    return torch.from_numpy(np.asarray(image, dtype=np.float32)).permute(2, 0, 1).unsqueeze(0)
+
+def assign_width_buckets(boxes, height, buckets):
+    """
+    Picks a canvas width per box: the smallest bucket that holds the crop once
+    it is resized to `height`, or the widest bucket for longer crops.
+    boxes: (B, 4) tensor. Returns a (B,) long tensor of widths.
+    """
+    boxes = boxes.to(torch.float64)
+    natural = torch.floor(height * (boxes[:, 2] - boxes[:, 0]) / (boxes[:, 3] - boxes[:, 1]))
+    bucket_t = torch.tensor(sorted(buckets), dtype=torch.float64)
+    idx = torch.searchsorted(bucket_t, natural).clamp(max=len(bucket_t) - 1)
+    return bucket_t[idx].long()
+
+def resize_and_pad_batch(page, boxes, height, width):
+    """
+    Batched, tensor-only equivalent of ResizeAndPad + ToTensor + Normalize.
+    page: (1, 3, H, W) float tensor in [0, 255] (see page_to_tensor)
+    boxes: (B, 4) tensor of clipped, non-empty [x1, y1, x2, y2]
+    Returns a (B, 3, height, width) tensor normalized to [-1, 1], padding at -1.
+
+    Each crop keeps its aspect ratio and is centered exactly like ResizeAndPad.
+    Instead of cropping, resizing and pasting one image at a time, every box is
+    widened to the region that would fill the whole padded canvas, crops that
+    need the same number of antialiasing taps are sampled from the page in one
+    grid_sample call, and the padding is masked out afterwards.
+    """
+    boxes = boxes.to(torch.float64)
+    x1, y1, x2, y2 = boxes.unbind(1)
+    w, h = x2 - x1, y2 - y1
+    aspect = w / h
+
+    # Same integer sizes and offsets ResizeAndPad computes (clamped to 1px
+    # so extreme slivers still produce a crop)
+    wide = aspect > (width / height)
+    new_w = torch.where(wide, torch.full_like(w, width), torch.floor(height * aspect)).clamp(min=1)
+    new_h = torch.where(wide, torch.floor(width / aspect), torch.full_like(h, height)).clamp(min=1)
+    pad_x = torch.where(wide, torch.zeros_like(w), torch.div(width - new_w, 2, rounding_mode='floor'))
+    pad_y = torch.where(wide, torch.div(height - new_h, 2, rounding_mode='floor'), torch.zeros_like(h))
+
+    # Source pixels per output pixel. Crops shrunk by a factor of about s take
+    # s evenly spaced bilinear taps per output pixel along each axis and
+    # average them, so every source pixel contributes (an area prefilter,
+    # the antialiasing LANCZOS has) instead of one point sample per pixel
+    scale_x, scale_y = w / new_w, h / new_h
+    taps_x = scale_x.round().clamp(1, MAX_SAMPLING_TAPS).long()
+    taps_y = scale_y.round().clamp(1, MAX_SAMPLING_TAPS).long()
+    page_h, page_w = page.shape[-2:]
+
+    crops = page.new_empty(len(boxes), page.shape[1], height, width)
+    taps = torch.stack([taps_x, taps_y], dim=1)
+    for kx, ky in taps.unique(dim=0).tolist():
+        idx = ((taps_x == kx) & (taps_y == ky)).nonzero().flatten()
+        n = len(idx)
+        # Page position of every tap (output pixel centers when there is one
+        # tap), in grid_sample's [-1, 1] coordinates
+        tap_cols = (torch.arange(width * kx, dtype=torch.float64) + 0.5) / kx - pad_x[idx, None]
+        tap_rows = (torch.arange(height * ky, dtype=torch.float64) + 0.5) / ky - pad_y[idx, None]
+        grid_x = (x1[idx, None] + tap_cols * scale_x[idx, None]) * (2.0 / page_w) - 1
+        grid_y = (y1[idx, None] + tap_rows * scale_y[idx, None]) * (2.0 / page_h) - 1
+        grid = torch.stack([
+            grid_x[:, None, :].expand(n, height * ky, width * kx),
+            grid_y[:, :, None].expand(n, height * ky, width * kx),
+        ], dim=-1).to(page.dtype)
+        sampled = F.grid_sample(page.expand(n, -1, -1, -1), grid, mode='bilinear',
+                                padding_mode='border', align_corners=False)
+        crops[idx] = F.avg_pool2d(sampled, (ky, kx)) if kx > 1 or ky > 1 else sampled
+
+    cols = torch.arange(width, dtype=torch.float64) + 0.5 - pad_x[:, None]
+    rows = torch.arange(height, dtype=torch.float64) + 0.5 - pad_y[:, None]
+    inside = ((cols >= 0) & (cols < new_w[:, None]))[:, None, :] & \
+             ((rows >= 0) & (rows < new_h[:, None]))[:, :, None]
+
+    # ToTensor + Normalize(0.5, 0.5): x / 255 * 2 - 1, black padding -> -1
+    crops = crops * inside.unsqueeze(1).to(crops.dtype)
+    return crops / 127.5 - 1.0
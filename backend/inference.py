@@ -0,0 +1,174 @@
+# backend/inference.py
+"""
+Inference backends used by OCREngine.
+Detectors expose detect_scored(images, conf, iou) -> [(boxes (N, 4) array, scores (N,) array), ...]
+and detect(images, conf, iou) -> [[x1, y1, x2, y2], ...] per image. detect_candidates(images, conf)
+returns the boxes before NMS, which filter_candidates() turns into detect_scored output for
+any conf/iou at or above that conf without running the model again.
+Recognizers are callables taking a (B, 3, H, W) tensor and returning (T, B, C) logits.
+"""
+import numpy as np
+import torch
+from PIL import Image
+
+from .config import ModelConfig
+
+
+def make_ort_session(path, intra_op_threads=0, inter_op_threads=0):
+    """Creates a CPU ONNX Runtime session (0 threads = let ORT decide)"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("onnxruntime is not installed (pip install onnxruntime)")
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    opts.intra_op_num_threads = intra_op_threads
+    opts.inter_op_num_threads = inter_op_threads
+    if inter_op_threads > 1:
+        opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(path, sess_options=opts, providers=['CPUExecutionProvider'])
+
+
+def filter_candidates(candidates, image_size, conf, iou):
+    """
+    Confidence filter + per-class NMS over one page's detect_candidates()
+    output, clipped to the page. Returns (boxes, scores) like detect_scored.
+    """
+    from torchvision.ops import batched_nms
+
+    boxes, scores, classes = candidates
+    mask = scores > conf
+    boxes, scores, classes = boxes[mask], scores[mask], classes[mask]
+
+    # Per-class NMS in torchvision's native kernel: this runs on every
+    # threshold change, over thousands of low-confidence candidates
+    keep = batched_nms(torch.from_numpy(np.ascontiguousarray(boxes, dtype=np.float32)),
+                       torch.from_numpy(np.ascontiguousarray(scores, dtype=np.float32)),
+                       torch.from_numpy(classes.astype(np.int64, copy=False)), iou)
+    keep = keep[:ModelConfig.YOLO_MAX_DET].numpy()
+    boxes, scores = boxes[keep], scores[keep]
+
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_size[0])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_size[1])
+    return boxes, scores
+
+
+class OnnxCRNN:
+    """CRNN exported with backend/onnx_export.py, run through ONNX Runtime"""
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0):
+        self.session = make_ort_session(path, intra_op_threads, inter_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        x = batch.detach().cpu().numpy().astype(np.float32, copy=False)
+        logits = self.session.run(None, {self.input_name: x})[0]
+        return torch.from_numpy(logits)
+
+
+class UltralyticsDetector:
+    """YOLO weights (.pt) run through ultralytics/PyTorch"""
+    def __init__(self, path):
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+
+    def detect_scored(self, images, conf, iou):
+        results = self.model.predict(images, conf=conf, iou=iou, max_det=ModelConfig.YOLO_MAX_DET, verbose=False)
+        scored = [(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy()) for r in results]
+        # Keep the output aligned with the input even if YOLO returned nothing
+        scored += [(np.zeros((0, 4), np.float32), np.zeros(0, np.float32))
+                   for _ in range(len(images) - len(scored))]
+        return scored
+
+    def detect(self, images, conf, iou):
+        return [boxes.tolist() for boxes, _ in self.detect_scored(images, conf, iou)]
+
+    def detect_candidates(self, images, conf):
+        # An IoU threshold of 1 suppresses nothing, so ultralytics' NMS passes every candidate through
+        results = self.model.predict(images, conf=conf, iou=1.0, max_det=ModelConfig.YOLO_MAX_CANDIDATES,
+                                     verbose=False)
+        candidates = [(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(),
+                       r.boxes.cls.cpu().numpy().astype(np.int64)) for r in results]
+        candidates += [(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64))
+                       for _ in range(len(images) - len(candidates))]
+        return candidates
+
+
+class OnnxDetector:
+    """
+    YOLOv8 exported to ONNX, run through ONNX Runtime without torch/ultralytics
+    on the hot path. Does the same letterbox pre-processing and conf/NMS
+    post-processing ultralytics applies.
+    """
+    PAD_VALUE = 114
+
+    def __init__(self, path, intra_op_threads=0, inter_op_threads=0):
+        self.session = make_ort_session(path, intra_op_threads, inter_op_threads)
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.dynamic_batch = not isinstance(inp.shape[0], int)
+
+        # Fixed-shape exports carry their size; dynamic ones record it in metadata
+        h, w = inp.shape[2], inp.shape[3]
+        if isinstance(h, int) and isinstance(w, int):
+            self.imgsz = (h, w)
+        else:
+            meta = self.session.get_modelmeta().custom_metadata_map
+            sizes = [int(v) for v in meta.get('imgsz', '').strip('[]').split(',') if v.strip()]
+            self.imgsz = tuple(sizes) if len(sizes) == 2 else (ModelConfig.YOLO_IMGSZ, ModelConfig.YOLO_IMGSZ)
+
+    def letterbox(self, image):
+        """Resizes keeping aspect and pads to imgsz. Returns (CHW float array, ratio, (left, top))"""
+        target_h, target_w = self.imgsz
+        r = min(target_h / image.height, target_w / image.width)
+        new_w, new_h = int(round(image.width * r)), int(round(image.height * r))
+        left = int(round((target_w - new_w) / 2 - 0.1))
+        top = int(round((target_h - new_h) / 2 - 0.1))
+
+        canvas = Image.new("RGB", (target_w, target_h), (self.PAD_VALUE,) * 3)
+        canvas.paste(image.resize((new_w, new_h), Image.Resampling.BILINEAR), (left, top))
+        arr = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return arr, r, (left, top)
+
+    def candidates(self, pred, ratio, offset, conf):
+        """
+        pred: (4 + num_classes, anchors) raw head output for one image.
+        Returns the (boxes, scores, classes) above conf, boxes in page
+        coordinates but not yet clipped (NMS sees them as YOLO drew them).
+        """
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        scores = class_scores.max(axis=1)
+        mask = scores > conf
+        pred, scores = pred[mask], scores[mask]
+        classes = class_scores[mask].argmax(axis=1)
+
+        # Undo the letterbox; IoUs are unchanged by the uniform scale
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - offset[0]) / ratio
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - offset[1]) / ratio
+        return boxes, scores, classes
+
+    def postprocess(self, pred, ratio, offset, image_size, conf, iou):
+        return filter_candidates(self.candidates(pred, ratio, offset, conf), image_size, conf, iou)
+
+    def detect(self, images, conf, iou):
+        return [boxes.tolist() for boxes, _ in self.detect_scored(images, conf, iou)]
+
+    def _predict(self, images):
+        prepared = [self.letterbox(im) for im in images]
+
+        if self.dynamic_batch:
+            batch = np.stack([p[0] for p in prepared])
+            preds = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            preds = np.concatenate([self.session.run(None, {self.input_name: p[0][None]})[0] for p in prepared])
+        return zip(preds, prepared)
+
+    def detect_scored(self, images, conf, iou):
+        return [self.postprocess(pred, r, offset, im.size, conf, iou)
+                for (pred, (_, r, offset)), im in zip(self._predict(images), images)]
+
+    def detect_candidates(self, images, conf):
+        return [self.candidates(pred, r, offset, conf) for pred, (_, r, offset) in self._predict(images)]
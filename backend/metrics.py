@@ -0,0 +1,297 @@
+# backend/metrics.py
+"""
+Optional per-stage instrumentation for OCREngine. Set engine.profiler to a
+Profiler and every run records, per page, the wall time and peak memory of
+each stage (decode, detect, crops, crnn, ctc), the box count and the batch
+sizes used. Finished pages are appended to a JSONL file, and every stage is
+also written as a Chrome trace event, so a run can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_MB = 1024 * 1024
+
+def _status_kb(field):
+    """A 'VmXXX:  1234 kB' field of /proc/self/status, in kB (None off Linux)"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def rss_mb():
+    kb = _status_kb("VmRSS:")
+    return kb / 1024 if kb is not None else None
+
+def peak_rss_mb():
+    """Process peak RSS since the last reset_peak_rss() (or since start)"""
+    kb = _status_kb("VmHWM:")
+    if kb is None:
+        import resource
+        # kB on Linux, bytes on macOS; never reset
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            kb /= 1024
+    return kb / 1024
+
+def reset_peak_rss():
+    """Restarts the peak RSS watermark (Linux). Returns False where that is not possible"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _cuda():
+    """torch.cuda when torch is loaded and already using the GPU, else None"""
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available() and torch.cuda.is_initialized():
+        return torch.cuda
+    return None
+
+class PageMetrics:
+    """What was measured for one run(), or for one group of pages in the pipeline"""
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.stages = {} # name -> {'calls', 'seconds', 'peak_rss_mb', 'batch_sizes'}
+        self.counts = {} # e.g. boxes, crops, cache_hits
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self.peak_rss_mb = None
+        self.peak_cuda_mb = None
+        self.error = None # Exception type name when the page did not finish
+
+    def add_stage(self, name, seconds, peak_mb=None, batch=None, peak_cuda_mb=None):
+        stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_rss_mb': None,
+                                              'batch_sizes': []})
+        stage['calls'] += 1
+        stage['seconds'] += seconds
+        if batch is not None:
+            stage['batch_sizes'].append(batch)
+        if peak_mb is not None:
+            stage['peak_rss_mb'] = max(stage['peak_rss_mb'] or 0, peak_mb)
+            self.peak_rss_mb = max(self.peak_rss_mb or 0, peak_mb)
+        if peak_cuda_mb is not None:
+            stage['peak_cuda_mb'] = max(stage.get('peak_cuda_mb') or 0, peak_cuda_mb)
+            self.peak_cuda_mb = max(self.peak_cuda_mb or 0, peak_cuda_mb)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self):
+        record = {
+            'pages': self.pages,
+            'started': round(self.started, 3),
+            'seconds': round(self.seconds, 6) if self.seconds is not None else None,
+            'peak_rss_mb': round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            'counts': self.counts,
+            'stages': {name: {k: round(v, 6 if k == 'seconds' else 1) if isinstance(v, float) else v
+                              for k, v in s.items()} for name, s in self.stages.items()},
+        }
+        if self.peak_cuda_mb is not None:
+            record['peak_cuda_mb'] = round(self.peak_cuda_mb, 1)
+        if self.error is not None:
+            record['error'] = self.error
+        return record
+
+    def summary(self):
+        """One line for a status bar, e.g. 'detect 120 ms, crnn 340 ms (4 batches) | 412 boxes | 0.52 s, peak 830 MB'"""
+        if self.counts.get('cache_hits'):
+            return f"cached, {self.seconds * 1000:.0f} ms"
+        parts = []
+        for name, s in self.stages.items():
+            text = f"{name} {s['seconds'] * 1000:.0f} ms"
+            if s['calls'] > 1:
+                text += f" ({s['calls']} batches)"
+            parts.append(text)
+        line = ", ".join(parts)
+        if 'boxes' in self.counts:
+            line += f" | {self.counts['boxes']} boxes"
+        if self.counts.get('crops') and 'crop_hits' in self.counts:
+            line += f", {self.counts['crop_hits'] / self.counts['crops']:.0%} crops deduplicated"
+        if self.counts.get('text_hits'):
+            line += f", {self.counts['text_hits']} read before"
+        if self.seconds is not None:
+            line += f" | {self.seconds:.2f} s"
+        if self.peak_rss_mb is not None:
+            line += f", peak {self.peak_rss_mb:.0f} MB"
+        return line
+
+class Profiler:
+    """
+    Collects PageMetrics and trace events; safe to share between threads.
+    A page is opened with page() (or begin()/end() when its stages run on
+    different threads, as in AnnotationPipeline) and stages inside it are
+    timed with stage(). Stage peaks come from the kernel's RSS watermark,
+    which is reset whenever a stage starts while no other one is running,
+    so they are exact for run() and cover the overlap when stages run
+    concurrently. Calls outside an open page are still traced, not recorded.
+
+    metrics_path: JSONL file, one PageMetrics per line (appended to)
+    trace_path: Chrome trace-event file. It is streamed as a JSON array
+                without its closing bracket, which trace viewers accept, so
+                memory stays flat and a killed run still leaves a usable trace.
+    """
+    def __init__(self, metrics_path=None, trace_path=None, memory=True):
+        self.memory = memory
+        self.last = None # PageMetrics of the last finished page
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0 # Stages running right now, over all threads
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._named_threads = set()
+        self._trace_started = False
+
+        self._metrics_file = self._open(metrics_path, "a")
+        self._trace_file = self._open(trace_path, "w")
+        if self._trace_file is not None:
+            self._trace_file.write("[\n")
+            self._emit({'name': 'process_name', 'ph': 'M', 'pid': self._pid, 'tid': 0,
+                        'args': {'name': 'OCREngine'}})
+            self._emit({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': 0,
+                        'args': {'name': 'pages'}})
+
+    @staticmethod
+    def _open(path, mode):
+        if not path:
+            return None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, mode, encoding="utf-8")
+
+    # --- Pages ---
+
+    @property
+    def current(self):
+        """The PageMetrics stages on this thread are recorded into, or None"""
+        return getattr(self._local, 'page', None)
+
+    def begin(self, pages):
+        return PageMetrics(pages)
+
+    @contextmanager
+    def use(self, page):
+        """Records this thread's stages into `page` (a PageMetrics from begin()) for the block"""
+        previous = self.current
+        self._local.page = page
+        try:
+            yield page
+        finally:
+            self._local.page = previous
+
+    def end(self, page):
+        """Closes a page from begin(): writes its JSONL line and its trace event"""
+        page.finish()
+        self.last = page
+        record = page.to_dict()
+        event = {'name': ", ".join(os.path.basename(p) for p in page.pages) or "page",
+                 'cat': 'page', 'ph': 'X', 'pid': self._pid, 'tid': 0,
+                 'ts': self._us(page._start), 'dur': page.seconds * 1e6,
+                 'args': {'counts': page.counts, 'peak_rss_mb': record['peak_rss_mb'], 'error': page.error}}
+        with self._lock:
+            if self._metrics_file is not None:
+                self._metrics_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._metrics_file.flush()
+            self._emit(event)
+
+    @contextmanager
+    def page(self, pages):
+        """begin() + use() + end() for a page processed on this thread"""
+        page = self.begin(pages)
+        try:
+            with self.use(page):
+                yield page
+        except BaseException as e:
+            page.error = type(e).__name__
+            raise
+        finally:
+            self.end(page)
+
+    def count(self, name, n=1):
+        page = self.current
+        if page is not None:
+            page.count(name, n)
+
+    # --- Stages ---
+
+    @contextmanager
+    def stage(self, name, batch=None):
+        """Times the block as stage `name`; batch is the number of items it handles"""
+        cuda = _cuda() if self.memory else None
+        with self._lock:
+            if self.memory and self._active == 0:
+                reset_peak_rss()
+                if cuda is not None:
+                    cuda.reset_peak_memory_stats()
+            self._active += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = peak_rss_mb() if self.memory else None
+            peak_cuda = cuda.max_memory_allocated() / _MB if cuda is not None else None
+            with self._lock:
+                self._active -= 1
+
+            page = self.current
+            if page is not None:
+                page.add_stage(name, seconds, peak, batch, peak_cuda)
+            if self._trace_file is not None:
+                self._trace_stage(name, start, seconds, peak, batch)
+
+    def _trace_stage(self, name, start, seconds, peak, batch):
+        thread = threading.current_thread()
+        args = {}
+        if batch is not None:
+            args['batch'] = batch
+        if peak is not None:
+            args['peak_rss_mb'] = round(peak, 1)
+        events = [{'name': name, 'cat': 'stage', 'ph': 'X', 'pid': self._pid, 'tid': thread.ident,
+                   'ts': self._us(start), 'dur': seconds * 1e6, 'args': args}]
+        if peak is not None:
+            events.append({'name': 'peak_rss_mb', 'ph': 'C', 'pid': self._pid,
+                           'ts': self._us(start + seconds), 'args': {'MB': round(peak, 1)}})
+        with self._lock:
+            if thread.ident not in self._named_threads:
+                self._named_threads.add(thread.ident)
+                self._emit({'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': thread.ident,
+                            'args': {'name': thread.name}})
+            for event in events:
+                self._emit(event)
+
+    # --- Output ---
+
+    def _us(self, t):
+        return round((t - self._origin) * 1e6, 1)
+
+    def _emit(self, event):
+        # Caller holds the lock (or is __init__)
+        if self._trace_file is not None:
+            self._trace_file.write((",\n" if self._trace_started else "") + json.dumps(event))
+            self._trace_started = True
+
+    def close(self):
+        """Flushes and closes the output files; the trace gets its closing bracket"""
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.write("\n]\n")
+                self._trace_file.close()
+                self._trace_file = None
+            if self._metrics_file is not None:
+                self._metrics_file.close()
+                self._metrics_file = None
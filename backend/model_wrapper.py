@@ -1,84 +1,445 @@
 # backend/model_wrapper.py
-import torch
-from torchvision import transforms
-from PIL import Image
-from ultralytics import YOLO  # Standard library
+# torch, torchvision, ultralytics and onnxruntime are imported inside the
+# methods that need them, so importing this module (and opening the GUI)
+# stays fast until a model is actually loaded.
 import sys
 import os
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import partial
 
 # Add root to path so we can import MyCRNN if it's in the root
 sys.path.append(os.getcwd())
 
-from MyCRNN import CRNN # Expecting this file in root
-from .config import ModelConfig, NUM_CLASSES, INT_TO_CHAR
-from .image_ops import ResizeAndPad
+from .config import ModelConfig, ProjectConfig, NUM_CLASSES, INT_TO_CHAR
+
+def build_crnn(path, device='cpu'):
+    """Builds the CRNN and loads a .pth/.pt checkpoint into it (eval mode)"""
+    import torch
+    from MyCRNN import CRNN # Expecting this file in root
+
+    model = CRNN(num_classes=NUM_CLASSES, input_height=ModelConfig.IMG_HEIGHT)
+    model.to(device)
+
+    # Memory-map the file so only the tensors we use are paged in (optimizer
+    # state etc. in training checkpoints is never read). Legacy non-zip
+    # checkpoints can't be mapped and take the normal path.
+    try:
+        checkpoint = torch.load(path, map_location=device, mmap=True)
+    except RuntimeError:
+        checkpoint = torch.load(path, map_location=device)
+    state_dict = checkpoint.get('model_state_dict', checkpoint.get('model', checkpoint))
+
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+class OCRCancelled(Exception):
+    """Raised inside OCREngine.run when its should_cancel callback returns True"""
 
 class OCREngine:
-    def __init__(self):
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    def __init__(self, intra_op_threads=None, inter_op_threads=None):
+        # CRNN device, decided when the CRNN is loaded
+        self.device = 'cpu'
+        # Detector backend (UltralyticsDetector / OnnxDetector) and CRNN callable
+        # (torch module / OnnxCRNN); picked from the file extension on load
         self.yolo_model = None
         self.crnn_model = None
-        
-        # Preprocessing for CRNN
-        self.transform = transforms.Compose([
-            ResizeAndPad(ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH),
-            transforms.ToTensor(),
-            transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
-        ])
+        # Pad short crops to narrower WIDTH_BUCKETS instead of IMG_WIDTH. Off by
+        # default: it pays off on pages dominated by short tokens (numbers,
+        # ledgers), ~2x there, and is a wash on prose (benchmarks/bench_width_buckets.py)
+        self.variable_width = False
+        # Load the CRNN fused, int8-quantized and channels-last (CPU only)
+        self.fast_cpu = False
+        # Detect and recognize tile by tile (very large scans)
+        self.tiled = False
+        self.tile_batch_budget_mb = ModelConfig.TILE_BATCH_BUDGET_MB
+        # CRNN micro-batches are sized to this; see crnn_batch_size()
+        self.crnn_batch_budget_mb = ModelConfig.CRNN_BATCH_BUDGET_MB
+        # Saved calibration entry for the loaded CRNN (backend.calibration), read on load
+        self.calibration_path = ProjectConfig.CALIBRATION_PATH
+        self.calibration = None
+
+        self.conf = ModelConfig.YOLO_CONF
+        self.iou = ModelConfig.YOLO_IOU
+        self.intra_op_threads = ModelConfig.INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        self.inter_op_threads = ModelConfig.INTER_OP_THREADS if inter_op_threads is None else inter_op_threads
+        self._transform = None
+
+        # Optional backend.cache.ResultCache; weights are hashed once per path
+        self.result_cache = None
+        self.yolo_path = None
+        self.crnn_path = None
+        self._weights_hashes = {}
+        # Optional backend.cache.CropCache: repeated crops skip the CRNN
+        self.crop_cache = None
+
+        # (page_id, decoded image) of the last page, for recognize_regions
+        self._page = None
+        # page_id -> YOLO candidates and texts read so far of recent pages (see detect_page)
+        self._detections = OrderedDict()
+
+        # Optional backend.metrics.Profiler timing every stage
+        self.profiler = None
+
+    @property
+    def transform(self):
+        """Per-crop PIL preprocessing for the CRNN (built on first use)"""
+        if self._transform is None:
+            from torchvision import transforms
+            from .image_ops import ResizeAndPad
+
+            self._transform = transforms.Compose([
+                ResizeAndPad(ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH),
+                transforms.ToTensor(),
+                transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
+            ])
+        return self._transform
+
+    def _stage(self, name, batch=None):
+        """Times a block as a profiler stage; a no-op while no profiler is set"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name, batch)
+
+    def _count(self, name, n=1):
+        if self.profiler is not None:
+            self.profiler.count(name, n)
+
+    def _set_torch_threads(self):
+        import torch
+        if self.intra_op_threads and torch.get_num_threads() != self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
 
     def load_yolo(self, path):
-        """Loads standard YOLOv8 model"""
+        """Loads a YOLOv8 model: .pt through ultralytics, .onnx through ONNX Runtime"""
         try:
             print(f"Loading YOLO from {path}")
-            self.yolo_model = YOLO(path)
+            from .inference import OnnxDetector, UltralyticsDetector
+
+            self._detections.clear() # Candidates of the previous detector
+
+            if path.lower().endswith('.onnx'):
+                self.yolo_model = OnnxDetector(path, self.intra_op_threads, self.inter_op_threads)
+                self.yolo_path = path
+                return True, "YOLO Loaded (ONNX Runtime)"
+            self._set_torch_threads()
+            self.yolo_model = UltralyticsDetector(path)
+            self.yolo_path = path
             return True, "YOLO Loaded"
         except Exception as e:
             return False, str(e)
 
     def load_crnn(self, path):
-        """Loads custom CRNN model"""
+        """Loads custom CRNN model: .pth/.pt through torch, .onnx through ONNX Runtime"""
         try:
             print(f"Loading CRNN from {path}")
-            self.crnn_model = CRNN(num_classes=NUM_CLASSES, input_height=ModelConfig.IMG_HEIGHT)
-            self.crnn_model.to(self.device)
-            
-            checkpoint = torch.load(path, map_location=self.device)
-            state_dict = checkpoint.get('model_state_dict', checkpoint.get('model', checkpoint))
-            
-            self.crnn_model.load_state_dict(state_dict)
-            self.crnn_model.eval()
-            return True, "CRNN Loaded"
+            if self.crop_cache is not None:
+                self.crop_cache.clear() # Texts read by the previous CRNN
+            for entry in self._detections.values():
+                entry['texts'].clear()
+            message = self._load_crnn(path)
+            self.crnn_path = path
+            self.load_calibration()
+            if self.calibration is not None:
+                message += f", calibrated batch {self.calibration['batch_size']}"
+            return True, message
         except Exception as e:
             return False, str(e)
 
+    def _load_crnn(self, path):
+        import torch
+        from .inference import OnnxCRNN
+        from .optimize import optimize_crnn_for_cpu
+
+        if path.lower().endswith('.onnx'):
+            self.crnn_model = OnnxCRNN(path, self.intra_op_threads, self.inter_op_threads)
+            return "CRNN Loaded (ONNX Runtime)"
+        self._set_torch_threads()
+        if self.fast_cpu:
+            self.device = 'cpu'
+            self.crnn_model = optimize_crnn_for_cpu(build_crnn(path, 'cpu'))
+            return "CRNN Loaded (fast CPU)"
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.crnn_model = build_crnn(path, self.device)
+        return "CRNN Loaded"
+
+    def load_calibration(self):
+        """Picks up the saved calibration for the loaded CRNN on this machine, if there is one"""
+        from .calibration import calibration_key, load_calibration
+        self.calibration = None
+        if self.calibration_path and os.path.exists(self.calibration_path):
+            self.calibration = load_calibration(self.calibration_path, calibration_key(self))
+
+    def crop_bytes(self, width, activation_bytes_per_pixel=None):
+        """Memory one crop of the given width costs in flight: its input tensor, sampling grid and activations"""
+        if activation_bytes_per_pixel is None:
+            activation_bytes_per_pixel = (self.calibration['activation_bytes_per_pixel'] if self.calibration
+                                          else ModelConfig.CRNN_ACTIVATION_BYTES_PER_PIXEL)
+        pixels = ModelConfig.IMG_HEIGHT * width
+        return pixels * (3 * 4 + 2 * 4 + activation_bytes_per_pixel)
+
+    def crnn_batch_size(self, width=ModelConfig.IMG_WIDTH):
+        """
+        Crops per CRNN forward pass at this crop width: CRNN_BATCH_SIZE, or the
+        calibrated size once there is one, capped so a micro-batch stays within
+        crnn_batch_budget_mb. Wider crops get smaller batches.
+        """
+        size = self.calibration['batch_size'] if self.calibration else ModelConfig.CRNN_BATCH_SIZE
+        if self.crnn_batch_budget_mb:
+            size = min(size, self.crnn_batch_budget_mb * 1024 * 1024 // self.crop_bytes(width))
+        return max(1, int(size))
+
+    def cache_options(self):
+        """Everything besides image and weights that changes what run() returns"""
+        return {
+            'conf': self.conf, 'iou': self.iou, 'max_det': ModelConfig.YOLO_MAX_DET,
+            'img': [ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH],
+            'variable_width': self.variable_width, 'fast_cpu': self.fast_cpu,
+            'tiled': [ModelConfig.TILE_SIZE, ModelConfig.TILE_OVERLAP] if self.tiled else None,
+            # 'perceptual' crop dedup can give lookalike words one text
+            'crop_cache': self.crop_cache.mode if self.crop_cache is not None else None,
+        }
+
+    def _weights_hash(self, path):
+        from .cache import file_hash
+        if path not in self._weights_hashes:
+            self._weights_hashes[path] = file_hash(path)
+        return self._weights_hashes[path]
+
+    def cache_lookup(self, image_path):
+        """
+        Returns (key, results). key is None when no result_cache is set;
+        results is None on a miss.
+        """
+        if self.result_cache is None:
+            return None, None
+        from .cache import file_hash, make_key
+
+        with self._stage('cache'):
+            key = make_key(file_hash(image_path), self._weights_hash(self.yolo_path),
+                           self._weights_hash(self.crnn_path), self.cache_options())
+            results = self.result_cache.get(key)
+        if results is not None:
+            self._count('cache_hits')
+        return key, results
+
+    def cache_store(self, key, results):
+        if key is not None and self.result_cache is not None:
+            self.result_cache.put(key, results)
+
+    def warm_up(self):
+        """Runs a dummy detection and CRNN batch so the first real run isn't slow"""
+        import torch
+        from PIL import Image
+
+        if self.yolo_model:
+            size = ModelConfig.YOLO_IMGSZ
+            self.detect(Image.new("RGB", (size, size), (255, 255, 255)))
+        if self.crnn_model:
+            self.recognize_tensors(torch.zeros(1, 3, ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH))
+
     def decode_predictions(self, preds):
-        """CTC Decoder logic"""
-        preds = preds.argmax(dim=2).permute(1, 0)
+        """
+        CTC greedy decoder over the (T, B, C) CRNN output.
+        Repeat-collapsing and blank removal run as whole-tensor ops; only the
+        final index -> character join is done per word.
+        """
+        best = preds.argmax(dim=2).permute(1, 0) # (B, T)
+
+        # Keep a step if it is not blank and differs from the step before it
+        keep = best != 0
+        keep[:, 1:] &= best[:, 1:] != best[:, :-1]
+
+        best, keep = best.cpu(), keep.cpu()
+        lengths = keep.sum(dim=1).tolist()
+        kept = best[keep].tolist() # Row-major, so words are contiguous
+
         decoded_texts = []
-        for pred in preds:
-            collapsed = []
-            for i, p in enumerate(pred):
-                if p != 0 and (i == 0 or p != pred[i-1]):
-                    collapsed.append(INT_TO_CHAR.get(p.item(), ''))
-            decoded_texts.append("".join(collapsed))
+        pos = 0
+        for n in lengths:
+            decoded_texts.append("".join([INT_TO_CHAR.get(i, '') for i in kept[pos:pos + n]]))
+            pos += n
         return decoded_texts
 
-    def run(self, image_path):
-        if not self.yolo_model or not self.crnn_model:
-            raise ValueError("Models not loaded")
+    def load_image(self, image_path):
+        """Decodes a page once so detection and recognition can share it"""
+        from PIL import Image
+        if self.tiled:
+            Image.MAX_IMAGE_PIXELS = None # Huge scans are what tiled mode is for
+        with self._stage('decode'):
+            return Image.open(image_path).convert("RGB")
 
-        # 1. Run YOLO
-        results = self.yolo_model.predict(image_path, conf=0.25, iou=0.7)
-        if not results:
-            return []
-            
-        boxes = results[0].boxes.xyxy.cpu().numpy().tolist() # [[x1,y1,x2,y2], ...]
-        if not boxes:
-            return []
+    @staticmethod
+    def page_id(image_path):
+        """Identifies a page file's content cheaply: path, modification time and size"""
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size
+
+    def page(self, image_path):
+        """Decoded page, reusing the last one while the file is unchanged"""
+        page_id = self.page_id(image_path)
+        page = self._page
+        if page is None or page[0] != page_id:
+            page = (page_id, self.load_image(image_path))
+            self._page = page
+        return page[1]
+
+    def forget_page(self, image_path):
+        """Drops everything kept about a page (decoded image, candidates, texts), e.g. when it is re-opened"""
+        path = os.path.abspath(image_path)
+        if self._page is not None and self._page[0][0] == path:
+            self._page = None
+        self._forget_detections(path)
+
+    def _forget_detections(self, path, keep=None):
+        # list() copies the keys in one step, so a run finishing on another thread can't break the loop
+        for page_id in list(self._detections):
+            if page_id[0] == path and page_id != keep:
+                self._detections.pop(page_id, None)
+
+    def image_size(self, image_path):
+        """(width, height) from the file header, without decoding pixels"""
+        from PIL import Image
+        with Image.open(image_path) as im:
+            return im.size
+
+    def detect(self, image):
+        """Runs YOLO on a decoded page. Returns [[x1, y1, x2, y2], ...]"""
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, images):
+        """Runs YOLO on several decoded pages in a single predict call"""
+        with self._stage('detect', len(images)):
+            if self.tiled:
+                boxes = [self.detect_tiled(image) for image in images]
+            else:
+                boxes = self.yolo_model.detect(images, self.conf, self.iou)
+        self._count('boxes', sum(len(b) for b in boxes))
+        return boxes
+
+    def _detection(self, image_path):
+        """
+        The page's entry in the detection cache, created (and the oldest page
+        dropped) as needed. Keyed by page_id, so a file rewritten in place
+        starts over instead of reusing the old boxes and texts.
+        """
+        page_id = self.page_id(image_path)
+        entry = self._detections.pop(page_id, None)
+        if entry is None:
+            # An older version of the same file is stale now
+            self._forget_detections(page_id[0], keep=page_id)
+            entry = {'conf': None, 'candidates': None, 'texts': {}}
+        self._detections[page_id] = entry
+        while len(self._detections) > ModelConfig.DETECTION_CACHE_PAGES:
+            self._detections.popitem(last=False)
+        return entry
+
+    def detect_page(self, image_path, image):
+        """
+        Runs YOLO on one page at the current conf/iou. The raw candidates
+        (before NMS, down to YOLO_CANDIDATE_CONF) are kept for recent pages,
+        so other thresholds on the same page only re-run the filter and NMS.
+        Tiled mode and detectors without detect_candidates run YOLO every time.
+        """
+        if self.tiled or not hasattr(self.yolo_model, 'detect_candidates'):
+            return self.detect(image)
+        from .inference import filter_candidates
+
+        entry = self._detection(image_path)
+        if entry['candidates'] is None or self.conf < entry['conf']:
+            floor = min(self.conf, ModelConfig.YOLO_CANDIDATE_CONF)
+            with self._stage('detect', 1):
+                entry['candidates'] = self.yolo_model.detect_candidates([image], floor)[0]
+            entry['conf'] = floor
+        with self._stage('filter', len(entry['candidates'][1])):
+            boxes, _ = filter_candidates(entry['candidates'], image.size, self.conf, self.iou)
+        self._count('boxes', len(boxes))
+        return boxes.tolist()
+
+    def detect_tiled(self, image):
+        """
+        Runs YOLO over overlapping TILE_SIZE tiles at native resolution, a
+        budget-sized batch of tiles at a time (see TILE_BATCH_BUDGET_MB). Words cut by a tile seam are
+        set aside, the rest are merged with a global NMS, and cut words no
+        tile saw whole are stitched back together.
+        """
+        from .tiling import merge_tile_detections, seam_mask, tile_grid, tiles_per_batch
 
-        # 2. Prepare CRNN Batch
-        main_image = Image.open(image_path).convert("RGB")
-        batch_tensors = []
+        size = ModelConfig.TILE_SIZE
+        tiles = tile_grid(image.width, image.height, size, ModelConfig.TILE_OVERLAP)
+        per_batch = tiles_per_batch(size, self.tile_batch_budget_mb)
+
+        whole, fragments = [], []
+        for start in range(0, len(tiles), per_batch):
+            batch_tiles = tiles[start:start + per_batch]
+            crops = [image.crop(t) for t in batch_tiles]
+            scored = self.yolo_model.detect_scored(crops, self.conf, self.iou)
+            for tile, (boxes, scores) in zip(batch_tiles, scored):
+                boxes = boxes + [tile[0], tile[1], tile[0], tile[1]]
+                clear = seam_mask(boxes, tile, image.size, ModelConfig.TILE_SEAM_MARGIN)
+                whole.append((boxes[clear], scores[clear]))
+                fragments.append((boxes[~clear], scores[~clear]))
+
+        return merge_tile_detections(whole, fragments, self.iou).tolist()
+
+    def clip_boxes(self, boxes, image_width, image_height, return_mask=False):
+        """
+        Truncates boxes to int pixels, clips them to the page and drops empty ones.
+        Returns a (B, 4) float tensor of the kept boxes (and the keep mask over
+        the input boxes if return_mask is set).
+        """
+        import torch
+        b = torch.as_tensor(boxes, dtype=torch.float64).reshape(-1, 4).trunc()
+        b[:, 0::2] = b[:, 0::2].clamp(0, image_width)
+        b[:, 1::2] = b[:, 1::2].clamp(0, image_height)
+        valid = (b[:, 2] > b[:, 0]) & (b[:, 3] > b[:, 1])
+        if return_mask:
+            return b[valid], valid
+        return b[valid]
+
+    def prepare_crops(self, main_image, boxes):
+        """
+        Clips boxes to the page and builds the normalized CRNN input for all of
+        them from a single tensor copy of the page.
+        Returns ({width: (positions, batch)}, valid_boxes), where positions index
+        into valid_boxes. There is a single IMG_WIDTH group unless
+        variable_width is on, in which case crops are grouped into WIDTH_BUCKETS.
+        """
+        with self._stage('crops', len(boxes)):
+            return self._prepare_crops(main_image, boxes)
+
+    def _prepare_crops(self, main_image, boxes):
+        import torch
+        from .image_ops import assign_width_buckets, page_to_tensor, resize_and_pad_batch
+
+        clipped = self.clip_boxes(boxes, main_image.width, main_image.height)
+        if len(clipped) == 0:
+            return {}, []
+
+        if self.variable_width:
+            widths = assign_width_buckets(clipped, ModelConfig.IMG_HEIGHT, ModelConfig.WIDTH_BUCKETS)
+        else:
+            widths = torch.full((len(clipped),), ModelConfig.IMG_WIDTH, dtype=torch.long)
+
+        page = page_to_tensor(main_image)
+        groups = {}
+        for width in widths.unique().tolist():
+            positions = (widths == width).nonzero().flatten()
+            # Sampled a CRNN batch at a time, so the sampling grid and other
+            # temporaries stay the size of one batch instead of the whole page
+            batch = torch.empty(len(positions), 3, ModelConfig.IMG_HEIGHT, width)
+            step = self.crnn_batch_size(width)
+            for start in range(0, len(positions), step):
+                batch[start:start + step] = resize_and_pad_batch(
+                    page, clipped[positions[start:start + step]], ModelConfig.IMG_HEIGHT, width)
+            groups[width] = (positions, batch)
+        return groups, clipped.long().tolist()
+
+    def prepare_crops_pil(self, main_image, boxes):
+        """Reference per-crop path (PIL crop -> ResizeAndPad -> ToTensor -> Normalize)"""
+        import torch
+        crop_tensors = []
         valid_boxes = []
 
         for box in boxes:
@@ -90,26 +451,320 @@ class OCREngine:
             if x2 <= x1 or y2 <= y1: continue # Skip invalid
 
             crop = main_image.crop((x1, y1, x2, y2))
-            batch_tensors.append(self.transform(crop))
+            crop_tensors.append(self.transform(crop))
             valid_boxes.append([x1, y1, x2, y2])
 
-        if not batch_tensors:
+        if not crop_tensors:
+            return None, []
+        return torch.stack(crop_tensors), valid_boxes
+
+    def recognize_tensors(self, batch, on_chunk=None, on_texts=None):
+        """
+        Reads a (N, 3, H, W) crop tensor in CRNN batches of crnn_batch_size(W).
+        After every batch on_texts(positions, texts) gets its texts (positions
+        index into `batch`), then on_chunk(num_crops) is called.
+        """
+        import torch
+        texts = []
+        step = self.crnn_batch_size(batch.shape[-1])
+        for start in range(0, len(batch), step):
+            chunk = batch[start:start + step].to(self.device)
+            with self._stage('crnn', len(chunk)), torch.no_grad():
+                preds = self.crnn_model(chunk)
+            with self._stage('ctc', len(chunk)):
+                chunk_texts = self.decode_predictions(preds)
+            texts.extend(chunk_texts)
+            if on_texts:
+                on_texts(range(start, start + len(chunk)), chunk_texts)
+            if on_chunk:
+                on_chunk(len(chunk))
+        return texts
+
+    def recognize_crops(self, batch, on_chunk=None, on_texts=None):
+        """
+        recognize_tensors, but with a crop_cache set only crops not seen before
+        reach the CRNN, each once however often it repeats in the batch; the
+        rest are copied from the cache or from their first occurrence.
+        """
+        if self.crop_cache is None or not len(batch):
+            return self.recognize_tensors(batch, on_chunk, on_texts)
+
+        import torch
+        with self._stage('dedup', len(batch)):
+            texts, unseen = self.crop_cache.lookup(self.crop_cache.keys(batch))
+
+        skipped = len(batch) - len(unseen)
+        self._count('crop_hits', skipped)
+        if on_texts:
+            # Cached texts are known now; in-batch repeats of unseen crops follow their first read
+            known = [i for i, text in enumerate(texts) if text is not None]
+            if known:
+                on_texts(known, [texts[i] for i in known])
+        if on_chunk and skipped:
+            on_chunk(skipped)
+        if unseen:
+            groups = list(unseen.values())
+
+            def on_unique(unique_positions, unique_texts):
+                positions, copies = [], []
+                for j, text in zip(unique_positions, unique_texts):
+                    positions.extend(groups[j])
+                    copies.extend([text] * len(groups[j]))
+                on_texts(positions, copies)
+
+            firsts = torch.tensor([positions[0] for positions in groups])
+            unique_texts = self.recognize_tensors(batch[firsts], on_chunk, on_unique if on_texts else None)
+            for (key, positions), text in zip(unseen.items(), unique_texts):
+                self.crop_cache.put(key, text)
+                for i in positions:
+                    texts[i] = text
+        return texts
+
+    def recognize(self, main_image, boxes):
+        """Crops every box out of the page and reads it with the CRNN"""
+        return self.recognize_batch([main_image], [boxes])[0]
+
+    def recognize_batch(self, images, boxes_per_image, on_crops=None, on_chunk=None, on_texts=None):
+        """
+        Pools the crops of several pages into fixed-size CRNN batches, then
+        maps the texts back to their page. Returns one result list per image.
+        on_crops(total) is called once the crops are ready, on_chunk(n) after
+        every CRNN batch, and on_texts(image index, [(id, text), ...]) with
+        the texts read so far, as soon as each batch is decoded.
+        """
+        if self.tiled:
+            return [self.recognize_tiled(image, boxes, on_crops, on_chunk,
+                                         partial(on_texts, img_idx) if on_texts else None)
+                    for img_idx, (image, boxes) in enumerate(zip(images, boxes_per_image))]
+        return self._recognize_pooled(images, boxes_per_image, on_crops, on_chunk, on_texts)
+
+    def recognize_tiled(self, main_image, boxes, on_crops=None, on_chunk=None, on_texts=None):
+        """
+        Recognizes a large page without a full-resolution tensor: every box
+        is cropped from a tile that contains it, and only a budget-sized
+        number of tiles is converted to tensors at a time.
+        on_texts([(id, text), ...]) streams texts as in recognize_batch.
+        """
+        from .tiling import assign_boxes_to_tiles, tile_grid, tiles_per_batch
+
+        if on_crops:
+            on_crops(len(boxes))
+        if not len(boxes):
             return []
 
-        # 3. Run CRNN
-        batch = torch.stack(batch_tensors).to(self.device)
-        with torch.no_grad():
-            preds = self.crnn_model(batch)
-        
-        texts = self.decode_predictions(preds)
-
-        # 4. Format Output
-        output_data = []
-        for i, text in enumerate(texts):
-            output_data.append({
-                'id': i,
-                'bbox': valid_boxes[i], # [x1, y1, x2, y2]
+        # Clip against the whole page first; every box is then whole inside
+        # its region and keeps a result
+        clipped = self.clip_boxes(boxes, main_image.width, main_image.height).numpy()
+        size = ModelConfig.TILE_SIZE
+        tiles = tile_grid(main_image.width, main_image.height, size, ModelConfig.TILE_OVERLAP)
+        groups = assign_boxes_to_tiles(clipped, tiles)
+        # A tile only needs its float copy and its crops while it is read
+        per_batch = tiles_per_batch(size, self.tile_batch_budget_mb, factor=4)
+
+        ordered = [None] * len(clipped)
+        for start in range(0, len(groups), per_batch):
+            chunk = groups[start:start + per_batch]
+            crops = [main_image.crop(region) for region, _ in chunk]
+            local_boxes = [clipped[idx] - [r[0], r[1], r[0], r[1]] for r, idx in chunk]
+
+            def on_tile_texts(tile, updates, chunk=chunk):
+                indices = chunk[tile][1]
+                on_texts([(indices[i], text) for i, text in updates])
+
+            tile_results = self._recognize_pooled(crops, local_boxes, on_chunk=on_chunk,
+                                                  on_texts=on_tile_texts if on_texts else None)
+            for (region, indices), results in zip(chunk, tile_results):
+                for i, res in zip(indices, results):
+                    x1, y1, x2, y2 = res['bbox']
+                    res['bbox'] = [x1 + region[0], y1 + region[1], x2 + region[0], y2 + region[1]]
+                    ordered[i] = res
+
+        for i, res in enumerate(ordered):
+            res['id'] = i
+        return ordered
+
+    def _recognize_pooled(self, images, boxes_per_image, on_crops=None, on_chunk=None, on_texts=None):
+        import torch
+        by_width = {} # width -> ([positions], [batches]) pooled over all pages
+        owners = [] # (image index, bbox) for every pooled crop
+        ids = [] # Result id of every pooled crop within its page
+        for img_idx, (image, boxes) in enumerate(zip(images, boxes_per_image)):
+            if not len(boxes):
+                continue
+            groups, valid_boxes = self.prepare_crops(image, boxes)
+            offset = len(owners)
+            owners.extend((img_idx, b) for b in valid_boxes)
+            ids.extend(range(len(valid_boxes)))
+            for width, (positions, batch) in groups.items():
+                pooled = by_width.setdefault(width, ([], []))
+                pooled[0].append(positions + offset)
+                pooled[1].append(batch)
+
+        self._count('crops', len(owners))
+        if on_crops:
+            on_crops(len(owners))
+
+        # Each width runs as its own set of batches, then texts go back in order.
+        # Batches are cut straight from the per-page tensors; concatenating them
+        # first would hold every crop twice
+        texts = [None] * len(owners)
+        for width, (positions, batches) in by_width.items():
+            positions = torch.cat(positions).tolist()
+            step = self.crnn_batch_size(width)
+            for start, chunk in self._pooled_chunks(batches, step):
+                chunk_positions = positions[start:start + len(chunk)]
+
+                def on_chunk_texts(local_positions, chunk_texts, chunk_positions=chunk_positions):
+                    per_page = {}
+                    for p, text in zip(local_positions, chunk_texts):
+                        pos = chunk_positions[p]
+                        per_page.setdefault(owners[pos][0], []).append((ids[pos], text))
+                    for img_idx, updates in per_page.items():
+                        on_texts(img_idx, updates)
+
+                chunk_texts = self.recognize_crops(chunk, on_chunk, on_chunk_texts if on_texts else None)
+                for pos, text in zip(chunk_positions, chunk_texts):
+                    texts[pos] = text
+
+        output_data = [[] for _ in images]
+        for (img_idx, bbox), text in zip(owners, texts):
+            page_results = output_data[img_idx]
+            page_results.append({
+                'id': len(page_results),
+                'bbox': bbox, # [x1, y1, x2, y2]
                 'text': text
             })
             
-        return output_data
\ No newline at end of file
+        return output_data
+
+    @staticmethod
+    def _pooled_chunks(batches, step):
+        """(start, tensor) runs of `step` crops over a list of crop tensors, copying only to join page edges"""
+        import torch
+        start, pending = 0, []
+        for batch in batches:
+            offset = 0
+            while offset < len(batch):
+                take = min(step - sum(len(t) for t in pending), len(batch) - offset)
+                pending.append(batch[offset:offset + take])
+                offset += take
+                if sum(len(t) for t in pending) == step:
+                    chunk = pending[0] if len(pending) == 1 else torch.cat(pending)
+                    yield start, chunk
+                    start += len(chunk)
+                    pending = []
+        if pending:
+            yield start, pending[0] if len(pending) == 1 else torch.cat(pending)
+
+    def recognize_regions(self, image_path, bboxes):
+        """
+        Reads only the given [x1, y1, x2, y2] boxes of a page, e.g. the ones a
+        user just drew or resized. The decoded page from the previous call (or
+        run()) is reused. Returns one text per bbox, '' for boxes that fall
+        outside the page.
+        """
+        if not self.crnn_model:
+            raise ValueError("CRNN not loaded")
+
+        image = self.page(image_path)
+        _, valid = self.clip_boxes(bboxes, image.width, image.height, return_mask=True)
+        valid = valid.tolist()
+        texts = iter(r['text'] for r in self.recognize(image, bboxes))
+        return [next(texts) if ok else '' for ok in valid]
+
+    def run_batch(self, image_paths):
+        """Like run(), but shares YOLO and CRNN batches across all images"""
+        if not self.yolo_model or not self.crnn_model:
+            raise ValueError("Models not loaded")
+
+        results = [None] * len(image_paths)
+        misses = [] # (index, cache key) of pages that need inference
+        for i, path in enumerate(image_paths):
+            key, cached = self.cache_lookup(path)
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append((i, key))
+
+        if misses:
+            images = [self.load_image(image_paths[i]) for i, _ in misses]
+            boxes_per_image = self.detect_batch(images)
+            for (i, key), page_results in zip(misses, self.recognize_batch(images, boxes_per_image)):
+                self.cache_store(key, page_results)
+                results[i] = page_results
+        return results
+
+    def run(self, image_path, progress=None, should_cancel=None, on_boxes=None, on_texts=None):
+        """
+        Detects and reads every word on a page.
+        progress: optional callback(stage, done, total) with stage 'detecting'
+                  or 'recognizing' (done/total count crops)
+        should_cancel: optional callable polled between steps; when it returns
+                       True the run stops by raising OCRCancelled
+        on_boxes: optional callback(results) called as soon as detection is
+                  done, with the final result list but every text still ''
+        on_texts: optional callback([(id, text), ...]) called after every
+                  CRNN batch with the texts it read, so a UI can fill in the
+                  boxes from on_boxes while the rest of the page is read
+        With a profiler set, the page's stage metrics end up in profiler.last.
+        """
+        if not self.yolo_model or not self.crnn_model:
+            raise ValueError("Models not loaded")
+
+        with self.profiler.page([image_path]) if self.profiler is not None else nullcontext():
+            return self._run(image_path, progress, should_cancel, on_boxes, on_texts)
+
+    def _run(self, image_path, progress, should_cancel, on_boxes=None, on_texts=None):
+        def step(stage, done, total):
+            if should_cancel and should_cancel():
+                raise OCRCancelled()
+            if progress:
+                progress(stage, done, total)
+
+        # 1. Identical page + models + thresholds: answer from the cache
+        key, cached = self.cache_lookup(image_path)
+        if cached is not None:
+            if on_boxes:
+                on_boxes(cached)
+            return cached
+
+        # 2. Decode the page once (kept for follow-up recognize_regions calls)
+        main_image = self.page(image_path)
+
+        # 3. Run YOLO (tile by tile in tiled mode), or re-filter the page's
+        #    candidates when only the thresholds changed since the last run
+        step('detecting', 0, 0)
+        boxes = self.detect_page(image_path, main_image)
+        # The boxes recognition keeps, in result order. Boxes read at earlier
+        # thresholds keep their text; only the others go to the CRNN
+        valid = self.clip_boxes(boxes, main_image.width, main_image.height).long().tolist() if boxes else []
+        known = self._detection(image_path)['texts']
+        keys = [(self.variable_width, *b) for b in valid]
+        results = [{'id': i, 'bbox': b, 'text': known.get(key)} for i, (b, key) in enumerate(zip(valid, keys))]
+        new = [i for i, res in enumerate(results) if res['text'] is None]
+        if on_boxes:
+            on_boxes([dict(res, text=res['text'] or '') for res in results])
+
+        # 4. Crop + run CRNN on the new boxes, reporting after every batch
+        total = 0
+        done = 0
+
+        def on_crops(n):
+            nonlocal total
+            total = n
+            step('recognizing', 0, total)
+
+        def on_chunk(n):
+            nonlocal done
+            done += n
+            step('recognizing', done, total)
+
+        page_texts = (lambda img_idx, updates: on_texts([(new[j], text) for j, text in updates])) \
+            if on_texts else None
+        if new:
+            read = self.recognize_batch([main_image], [[valid[i] for i in new]], on_crops, on_chunk, page_texts)[0]
+            for i, res in zip(new, read):
+                results[i]['text'] = known[keys[i]] = res['text']
+        self._count('text_hits', len(valid) - len(new))
+        self.cache_store(key, results)
+        return results
\ No newline at end of file
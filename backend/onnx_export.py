@@ -0,0 +1,34 @@
+# backend/onnx_export.py
+import os
+import shutil
+
+import torch
+
+from .config import ModelConfig
+from .model_wrapper import build_crnn
+
+def export_crnn(checkpoint_path, output_path, opset=17):
+    """
+    Exports a CRNN .pth/.pt checkpoint to ONNX.
+    Batch size and input width are dynamic, so the file also serves the
+    variable-width (WIDTH_BUCKETS) mode.
+    """
+    model = build_crnn(checkpoint_path, 'cpu')
+    dummy = torch.randn(1, 3, ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH)
+    torch.onnx.export(
+        model, dummy, output_path,
+        input_names=['input'], output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch', 3: 'width'}, 'logits': {0: 'time', 1: 'batch'}},
+        opset_version=opset,
+    )
+    return output_path
+
+def export_yolo(weights_path, output_path=None, imgsz=ModelConfig.YOLO_IMGSZ):
+    """Exports YOLO .pt weights to ONNX (dynamic batch) through ultralytics"""
+    from ultralytics import YOLO
+
+    exported = YOLO(weights_path).export(format='onnx', dynamic=True, imgsz=imgsz)
+    if output_path and os.path.abspath(exported) != os.path.abspath(output_path):
+        shutil.move(exported, output_path)
+        return output_path
+    return exported
@@ -0,0 +1,70 @@
+# backend/optimize.py
+import copy
+import warnings
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+def fuse_conv_bn(sequential):
+    """Folds every Conv2d -> BatchNorm2d pair of an nn.Sequential in place"""
+    layers = list(sequential)
+    for i in range(len(layers) - 1):
+        conv, bn = layers[i], layers[i + 1]
+        if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+            sequential[i] = fuse_conv_bn_eval(conv, bn)
+            sequential[i + 1] = nn.Identity()
+    return sequential
+
+class FastCPUCRNN(nn.Module):
+    """
+    CPU inference wrapper produced by optimize_crnn_for_cpu.
+    Feeds the CNN channels-last input; outputs match CRNN.forward.
+    """
+    def __init__(self, model, channels_last=True):
+        super().__init__()
+        self.model = model
+        self.channels_last = channels_last
+
+    def forward(self, x):
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        return self.model(x)
+
+def optimize_crnn_for_cpu(model, quantize=True, channels_last=True):
+    """
+    Returns an optimized copy of a float CRNN for CPU inference:
+    - Conv+BatchNorm pairs in model.cnn folded into single convolutions
+    - nn.LSTM / nn.Linear dynamically quantized to int8
+    - convolutions run in channels-last memory layout
+    The original model is left untouched.
+    """
+    model = copy.deepcopy(model).cpu().eval()
+    fuse_conv_bn(model.cnn)
+
+    if channels_last:
+        model.cnn.to(memory_format=torch.channels_last)
+
+    if quantize:
+        model = quantize_lstm_linear(model)
+
+    return FastCPUCRNN(model, channels_last).eval()
+
+def quantize_lstm_linear(model):
+    """
+    Dynamic int8 quantization of nn.LSTM / nn.Linear. torch.ao.quantization
+    warns that it is deprecated in favour of torchao, whose quantize_ has no
+    dynamic LSTM path, so the warning is silenced here; on a torch without
+    the old API the model is returned unquantized.
+    """
+    quantization = getattr(torch.ao, 'quantization', None)
+    quantize_dynamic = getattr(quantization, 'quantize_dynamic', None)
+    if quantize_dynamic is None:
+        warnings.warn("This torch has no torch.ao.quantization.quantize_dynamic; "
+                      "the fast CPU CRNN keeps float LSTM/Linear layers", RuntimeWarning)
+        return model
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=DeprecationWarning, message=r".*torch\.ao\.quantization")
+        # Raised while the quantized LSTM packs its weights, for the same deprecation
+        warnings.filterwarnings("ignore", category=UserWarning, message=r".*torch\.quantize_per_tensor")
+        return quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
@@ -0,0 +1,217 @@
+# backend/pipeline.py
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+
+from .config import ModelConfig
+from .exporter import save_to_voc_xml, save_to_yolo
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Sentinel pushed through the queues once a stage has no more work
+_DONE = object()
+
+
+def list_images(input_dir):
+    """Returns the sorted image paths directly inside input_dir"""
+    names = sorted(os.listdir(input_dir))
+    return [os.path.join(input_dir, n) for n in names if n.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def label_paths(output_dir, image_path):
+    """Same layout the GUI's Save button uses: data/labels/*.txt and xml_labels/*.xml"""
+    name_no_ext = os.path.splitext(os.path.basename(image_path))[0]
+    yolo_path = os.path.join(output_dir, "data", "labels", f"{name_no_ext}.txt")
+    xml_path = os.path.join(output_dir, "xml_labels", f"{name_no_ext}.xml")
+    return yolo_path, xml_path
+
+
+class AnnotationPipeline:
+    """
+    Headless decode -> detect -> recognize -> export pipeline.
+    Each stage runs in its own thread and hands groups of pages to the next one
+    through a bounded queue, so disk I/O, YOLO and the CRNN overlap instead of
+    running back to back. Torch and PIL release the GIL in their heavy loops,
+    which is what makes plain threads enough here. Every group goes through
+    YOLO in one predict call and its crops share CRNN batches.
+    """
+    def __init__(self, engine, output_dir=".", queue_size=8, batch_size=None, on_page=None,
+                 annotation_index=None):
+        self.engine = engine
+        self.output_dir = output_dir
+        self.queue_size = queue_size
+        self.batch_size = batch_size or ModelConfig.YOLO_BATCH_SIZE
+        self.on_page = on_page # Optional callback(path, num_words)
+        self.annotation_index = annotation_index # Optional AnnotationIndex kept in sync with the labels
+
+        self.errors = []
+        self.num_words = 0
+        self.num_saved = 0
+        self.num_empty = 0
+        self._lock = threading.Lock()
+
+    # --- Stages ---
+    # Each stage takes a group dict and returns it (or None to drop it)
+
+    def _decode(self, group):
+        # Pages found in the engine's result cache skip straight to export
+        paths, images, keys, hits = [], [], [], []
+        for path in group['paths']:
+            try:
+                key, cached = self.engine.cache_lookup(path)
+                if cached is not None:
+                    hits.append((path, self.engine.image_size(path), cached))
+                    continue
+                images.append(self.engine.load_image(path))
+                paths.append(path)
+                keys.append(key)
+            except Exception as e:
+                self._record_error(path, e)
+        if not paths and not hits:
+            return None
+        group['paths'], group['images'], group['keys'], group['hits'] = paths, images, keys, hits
+        return group
+
+    def _detect(self, group):
+        group['boxes'] = self.engine.detect_batch(group['images']) if group['images'] else []
+        return group
+
+    def _recognize(self, group):
+        boxes = group.pop('boxes')
+        group['results'] = self.engine.recognize_batch(group['images'], boxes) if boxes else []
+        return group
+
+    def _export(self, group):
+        pages = [(path, image.size, results) for path, image, results
+                 in zip(group['paths'], group['images'], group['results'])]
+        for key, (_, _, results) in zip(group['keys'], pages):
+            self.engine.cache_store(key, results)
+
+        for path, size, results in pages + group['hits']:
+            self._save_page(path, size, results)
+        return None
+
+    def _save_page(self, path, size, results):
+        if results:
+            yolo_path, xml_path = label_paths(self.output_dir, path)
+            save_to_yolo(results, size[0], size[1], yolo_path)
+            save_to_voc_xml(results, os.path.basename(path), size, xml_path)
+            if self.annotation_index is not None:
+                self.annotation_index.record_save(path, size, results, xml_path)
+
+        with self._lock:
+            self.num_words += len(results)
+            if results:
+                self.num_saved += 1
+            else:
+                self.num_empty += 1
+
+        if self.on_page:
+            self.on_page(path, len(results))
+
+    # --- Plumbing ---
+
+    def _record_error(self, path, err):
+        with self._lock:
+            self.errors.append((path, str(err)))
+
+    def _stage_loop(self, fn, in_q, out_q):
+        while True:
+            group = in_q.get()
+            if group is _DONE:
+                if out_q is not None:
+                    out_q.put(_DONE)
+                return
+            # With engine.profiler set, each group is one metrics record, carried
+            # from stage to stage and written once the group leaves the pipeline
+            profiler = self.engine.profiler
+            metrics = None
+            if profiler is not None:
+                metrics = group.setdefault('metrics', profiler.begin(group['paths']))
+            try:
+                with profiler.use(metrics) if metrics is not None else nullcontext():
+                    result = fn(group)
+            except Exception as e:
+                for path in group['paths'] + [h[0] for h in group.get('hits', [])]:
+                    self._record_error(path, e)
+                result = None
+                if metrics is not None:
+                    metrics.error = type(e).__name__
+            if metrics is not None and (result is None or out_q is None):
+                profiler.end(metrics)
+            if out_q is not None and result is not None:
+                out_q.put(result)
+
+    def _make_dirs(self):
+        os.makedirs(os.path.join(self.output_dir, "data", "labels"), exist_ok=True)
+        os.makedirs(os.path.join(self.output_dir, "xml_labels"), exist_ok=True)
+
+    def _stats(self, num_images, elapsed):
+        return {
+            'images': num_images,
+            'saved': self.num_saved,
+            'empty': self.num_empty,
+            'words': self.num_words,
+            'errors': list(self.errors),
+            'seconds': elapsed,
+            'images_per_sec': num_images / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def run(self, image_paths):
+        """Processes every path and returns a stats dict"""
+        self._make_dirs()
+
+        stages = [self._decode, self._detect, self._recognize, self._export]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+
+        threads = []
+        for i, fn in enumerate(stages):
+            out_q = queues[i + 1] if i + 1 < len(queues) else None
+            t = threading.Thread(target=self._stage_loop, args=(fn, queues[i], out_q),
+                                 name=f"pipeline-{fn.__name__.strip('_')}", daemon=True)
+            t.start()
+            threads.append(t)
+
+        start = time.perf_counter()
+        for i in range(0, len(image_paths), self.batch_size):
+            queues[0].put({'paths': image_paths[i:i + self.batch_size]})
+        queues[0].put(_DONE)
+
+        for t in threads:
+            t.join()
+        return self._stats(len(image_paths), time.perf_counter() - start)
+
+    def run_pool(self, image_paths, pool):
+        """
+        Like run(), but decode, detection and recognition happen in the
+        worker processes of a backend.worker_pool.OCRProcessPool. This process
+        answers cache hits, and saves pages as the workers stream them back.
+        """
+        self._make_dirs()
+        start = time.perf_counter()
+
+        misses, keys = [], {}
+        for path in image_paths:
+            try:
+                key, cached = self.engine.cache_lookup(path)
+                if cached is not None:
+                    self._save_page(path, self.engine.image_size(path), cached)
+                    continue
+            except Exception as e:
+                self._record_error(path, e)
+                continue
+            misses.append(path)
+            keys[path] = key
+
+        for path, size, results, error in pool.imap(misses):
+            if error is not None:
+                self._record_error(path, error)
+                continue
+            try:
+                self.engine.cache_store(keys[path], results)
+                self._save_page(path, size, results)
+            except Exception as e:
+                self._record_error(path, e)
+        return self._stats(len(image_paths), time.perf_counter() - start)
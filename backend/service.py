@@ -0,0 +1,345 @@
+# backend/service.py
+"""
+Local OCR service: one process holds the OCREngine and many clients (GUIs,
+ingest scripts) send it pages over HTTP, on a TCP port or a Unix socket.
+Requests that arrive close together are merged into one YOLO call and
+shared CRNN batches, up to max_batch pages or max_wait seconds after the
+first one. RemoteOCREngine is the client: it has the parts of the OCREngine
+API the GUI uses, so the GUI can use the service instead of loading models.
+
+Protocol, all JSON:
+    POST /ocr        {"path": str} or {"image": base64}  -> {"results": [...], "batch": n}
+    POST /recognize  same, plus {"boxes": [[x1, y1, x2, y2], ...]} -> {"texts": [...], "batch": n}
+    GET  /health     -> {"yolo": str, "crnn": str, "max_batch": n, "max_wait_ms": ms, ...}
+Paths are read by the service, so they only work when it shares the client's disk.
+"""
+import base64
+import http.client
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from .model_wrapper import OCRCancelled
+
+DEFAULT_PORT = 8765
+
+class _Job:
+    """One page waiting for the batcher. boxes=None means detect them"""
+    __slots__ = ('name', 'image', 'boxes', 'results', 'error', 'batch', 'done')
+
+    def __init__(self, name, image, boxes=None):
+        self.name = name
+        self.image = image
+        self.boxes = boxes
+        self.results = None
+        self.error = None
+        self.batch = 0
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """
+    Runs submitted pages through the engine on a single thread, merging the
+    pages that arrive within max_wait of each other (at most max_batch) into
+    one detect_batch and one recognize_batch call.
+    """
+    def __init__(self, engine, max_batch=8, max_wait=0.01):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.num_batches = 0
+        self.num_pages = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="ocr-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, name, image, boxes=None):
+        """Blocks until the page went through a batch. Returns (results, batch size)"""
+        job = _Job(name, image, boxes)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results, job.batch
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        jobs = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(jobs) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None) # Stop after this batch
+                break
+            jobs.append(job)
+        return jobs
+
+    def _loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs = self._collect(job)
+            try:
+                self._run(jobs)
+            except Exception as e:
+                for j in jobs:
+                    j.error = e
+            for j in jobs:
+                j.batch = len(jobs)
+                j.done.set()
+
+    def _run(self, jobs):
+        engine = self.engine
+        profiler = engine.profiler
+        with profiler.page([j.name for j in jobs]) if profiler is not None else nullcontext():
+            to_detect = [j for j in jobs if j.boxes is None]
+            if to_detect:
+                for j, boxes in zip(to_detect, engine.detect_batch([j.image for j in to_detect])):
+                    j.boxes = boxes
+            results = engine.recognize_batch([j.image for j in jobs], [j.boxes for j in jobs])
+        for j, page_results in zip(jobs, results):
+            j.results = page_results
+        self.num_batches += 1
+        self.num_pages += len(jobs)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, self.server.health())
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._reply(400, {'error': f"Bad request: {e}"})
+            return
+
+        if self.path == "/ocr":
+            handler = self.server.ocr
+        elif self.path == "/recognize":
+            handler = self.server.recognize
+        else:
+            self._reply(404, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            self._reply(200, handler(request))
+        except (ValueError, OSError) as e:
+            self._reply(400, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+
+class _ServiceMixin:
+    """What the TCP and Unix socket servers share: the engine, batcher and request handling"""
+    daemon_threads = True
+
+    def setup_service(self, engine, max_batch, max_wait, verbose):
+        self.engine = engine
+        self.batcher = MicroBatcher(engine, max_batch, max_wait)
+        self.verbose = verbose
+
+    def load(self, request):
+        """(name, decoded page) for a request's path or base64 image"""
+        from PIL import Image
+
+        if request.get('path'):
+            return request['path'], self.engine.load_image(request['path'])
+        if request.get('image'):
+            image = Image.open(io.BytesIO(base64.b64decode(request['image']))).convert("RGB")
+            return request.get('name', "upload"), image
+        raise ValueError("Request needs a 'path' or an 'image'")
+
+    def ocr(self, request):
+        key = None
+        if request.get('path'):
+            # Only files can be looked up; the cache is keyed by file hash
+            key, cached = self.engine.cache_lookup(request['path'])
+            if cached is not None:
+                return {'results': cached, 'batch': 0}
+        name, image = self.load(request)
+        results, batch = self.batcher.submit(name, image)
+        self.engine.cache_store(key, results)
+        return {'results': results, 'batch': batch}
+
+    def recognize(self, request):
+        boxes = request.get('boxes')
+        if not isinstance(boxes, list):
+            raise ValueError("Request needs 'boxes'")
+        name, image = self.load(request)
+        valid = self.engine.clip_boxes(boxes, image.width, image.height, return_mask=True)[1].tolist()
+        results, batch = self.batcher.submit(name, image, boxes)
+        texts = iter(r['text'] for r in results)
+        return {'texts': [next(texts) if ok else '' for ok in valid], 'batch': batch}
+
+    def health(self):
+        return {
+            'yolo': os.path.basename(self.engine.yolo_path or ""),
+            'crnn': os.path.basename(self.engine.crnn_path or ""),
+            'max_batch': self.batcher.max_batch,
+            'max_wait_ms': self.batcher.max_wait * 1000,
+            'batches': self.batcher.num_batches,
+            'pages': self.batcher.num_pages,
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.stop()
+
+class OCRServer(_ServiceMixin, ThreadingHTTPServer):
+    def __init__(self, engine, host="127.0.0.1", port=DEFAULT_PORT, max_batch=8, max_wait=0.01, verbose=False):
+        self.setup_service(engine, max_batch, max_wait, verbose)
+        super().__init__((host, port), _Handler)
+
+class UnixOCRServer(_ServiceMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    def __init__(self, engine, socket_path, max_batch=8, max_wait=0.01, verbose=False):
+        self.setup_service(engine, max_batch, max_wait, verbose)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path) # Left behind by a previous run
+        super().__init__(socket_path, _Handler)
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0) # BaseHTTPRequestHandler logs client_address[0]
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class RemoteOCREngine:
+    """
+    Client for an OCR service, standing in for OCREngine in the GUI.
+    url: http://host:port, or unix:///path/to/socket
+    send_images: upload the page bytes instead of its path (service on another machine or container)
+    """
+    def __init__(self, url, send_images=False, timeout=300):
+        self.url = url
+        self.send_images = send_images
+        self.timeout = timeout
+        self.profiler = None
+        self.info = {}
+
+        if url.startswith("unix:"):
+            path = url[len("unix:"):]
+            self.socket_path = path[2:] if path.startswith("//") else path
+        else:
+            self.socket_path = None
+            parts = urlsplit(url if "//" in url else f"http://{url}")
+            self.host, self.port = parts.hostname or "127.0.0.1", parts.port or DEFAULT_PORT
+
+    # The GUI checks these before running; the models live in the service
+    @property
+    def yolo_model(self):
+        return self.info.get('yolo')
+
+    @property
+    def crnn_model(self):
+        return self.info.get('crnn')
+
+    def describe(self):
+        return f"OCR service at {self.url} ({self.info.get('yolo')}, {self.info.get('crnn')})"
+
+    def _connection(self):
+        if self.socket_path:
+            return _UnixConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _call(self, method, path, payload=None):
+        conn = self._connection()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            reply = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"OCR service: {reply.get('error', response.reason)}")
+        return reply
+
+    def _page_request(self, image_path):
+        if self.send_images:
+            with open(image_path, "rb") as f:
+                return {'image': base64.b64encode(f.read()).decode("ascii"),
+                        'name': os.path.basename(image_path)}
+        return {'path': os.path.abspath(image_path)}
+
+    def load_yolo(self, path):
+        return False, f"Models are loaded by the OCR service at {self.url}"
+
+    load_crnn = load_yolo
+
+    def warm_up(self):
+        """Checks the service is up and learns which models it serves"""
+        self.info = self._call("GET", "/health")
+
+    def run(self, image_path, progress=None, should_cancel=None, on_boxes=None, on_texts=None):
+        """
+        Same contract as OCREngine.run, except that the service answers in one
+        piece: cancelling only takes effect before or after the request, and
+        on_boxes gets the finished results (on_texts is never called).
+        """
+        if should_cancel and should_cancel():
+            raise OCRCancelled()
+        if progress:
+            progress('detecting', 0, 0)
+        profiler = self.profiler
+        with profiler.page([image_path]) if profiler is not None else nullcontext():
+            with profiler.stage('request') if profiler is not None else nullcontext():
+                reply = self._call("POST", "/ocr", self._page_request(image_path))
+            if profiler is not None:
+                profiler.count('boxes', len(reply['results']))
+                profiler.count('service_batch', reply['batch'])
+        if should_cancel and should_cancel():
+            raise OCRCancelled()
+        if on_boxes:
+            on_boxes(reply['results'])
+        return reply['results']
+
+    def recognize_regions(self, image_path, bboxes):
+        request = self._page_request(image_path)
+        request['boxes'] = [list(map(float, b)) for b in bboxes]
+        return self._call("POST", "/recognize", request)['texts']
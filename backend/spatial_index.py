@@ -0,0 +1,136 @@
+# backend/spatial_index.py
+"""
+Uniform grid index over axis-aligned boxes, updated in place as boxes are
+added, moved, resized or removed. Keys are any hashable (the GUI uses its
+BoxItems, the backend uses result indices).
+"""
+import math
+
+# Roughly one word height on a 300 dpi scan; a box spans a handful of cells
+DEFAULT_CELL_SIZE = 64
+
+def box_iou(a, b):
+    """IoU of two [x1, y1, x2, y2] boxes"""
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class BoxIndex:
+    """
+    Maps each key to its [x1, y1, x2, y2] box and each grid cell to the keys
+    whose box touches it, so queries only look at boxes near the area asked
+    about instead of every box on the page.
+    """
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self._boxes = {} # key -> (x1, y1, x2, y2)
+        self._cells = {} # (col, row) -> set of keys
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    def bbox(self, key):
+        return list(self._boxes[key])
+
+    def items(self):
+        return ((k, list(b)) for k, b in self._boxes.items())
+
+    def _cell_range(self, box):
+        s = self.cell_size
+        return (int(math.floor(box[0] / s)), int(math.floor(box[1] / s)),
+                int(math.floor(box[2] / s)), int(math.floor(box[3] / s)))
+
+    def _cells_of(self, box):
+        c1, r1, c2, r2 = self._cell_range(box)
+        return ((c, r) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+
+    # --- Updates ---
+
+    def insert(self, key, bbox):
+        """Adds a box, or moves it if the key is already indexed"""
+        if key in self._boxes:
+            self.remove(key)
+        box = tuple(float(v) for v in bbox)
+        self._boxes[key] = box
+        for cell in self._cells_of(box):
+            self._cells.setdefault(cell, set()).add(key)
+
+    def update(self, key, bbox):
+        """Re-indexes a moved/resized box; only cells it entered or left change"""
+        old = self._boxes.get(key)
+        box = tuple(float(v) for v in bbox)
+        if old is None:
+            self.insert(key, box)
+            return
+        if self._cell_range(old) != self._cell_range(box):
+            old_cells, new_cells = set(self._cells_of(old)), set(self._cells_of(box))
+            for cell in old_cells - new_cells:
+                self._discard(cell, key)
+            for cell in new_cells - old_cells:
+                self._cells.setdefault(cell, set()).add(key)
+        self._boxes[key] = box
+
+    def remove(self, key):
+        box = self._boxes.pop(key, None)
+        if box is None:
+            return
+        for cell in self._cells_of(box):
+            self._discard(cell, key)
+
+    def _discard(self, cell, key):
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def clear(self):
+        self._boxes.clear()
+        self._cells.clear()
+
+    # --- Queries ---
+
+    def _candidates(self, box):
+        found = set()
+        for cell in self._cells_of(box):
+            found.update(self._cells.get(cell, ()))
+        return found
+
+    def query(self, bbox):
+        """Keys whose box intersects the [x1, y1, x2, y2] range"""
+        return [k for k in self._candidates(bbox) if _intersects(self._boxes[k], bbox)]
+
+    def overlapping(self, key, min_iou=0.0):
+        """Other keys whose box overlaps key's box by more than min_iou"""
+        box = self._boxes[key]
+        return [k for k in self.query(box) if k != key and box_iou(box, self._boxes[k]) > min_iou]
+
+    def overlapping_pairs(self, min_iou=0.5):
+        """
+        Every pair of boxes with IoU above min_iou, e.g. duplicate detections.
+        Returns [(key_a, key_b, iou), ...]; each pair is reported once.
+        """
+        pairs, done = [], set()
+        for key, box in self._boxes.items():
+            done.add(key)
+            for other in self.query(box):
+                if other in done:
+                    continue
+                iou = box_iou(box, self._boxes[other])
+                if iou > min_iou:
+                    pairs.append((key, other, iou))
+        return pairs
@@ -0,0 +1,138 @@
+# backend/tiling.py
+"""Helpers for running detection and recognition tile by tile on very large pages."""
+import numpy as np
+
+from .geometry import nms
+
+# Rough working memory of one detector input tile, as a multiple of its
+# float32 input tensor (activations of a small YOLOv8 at its native size)
+DETECTOR_MEMORY_FACTOR = 40
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Overlapping tiles covering a page, row by row.
+    Returns [(x1, y1, x2, y2), ...]; edge tiles are shifted inwards so every
+    tile is full size whenever the page is at least tile_size wide/high.
+    """
+    stride = max(tile_size - overlap, 1)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+def tiles_per_batch(tile_size, budget_mb, factor=DETECTOR_MEMORY_FACTOR):
+    """
+    How many tiles can be in flight together within the budget, each costing
+    `factor` times its float32 tensor
+    """
+    per_tile = tile_size * tile_size * 3 * 4 * factor
+    return max(1, int(budget_mb * 1024 * 1024 // per_tile))
+
+def seam_mask(boxes, tile, page_size, margin):
+    """
+    Marks boxes touching a tile edge that is not also a page edge, i.e. words
+    possibly cut by the seam. With an overlap wider than the word, the
+    neighbouring tile holds it whole.
+    boxes: (N, 4) array in page coordinates. Returns True for boxes clear of seams.
+    """
+    x1, y1, x2, y2 = tile
+    page_w, page_h = page_size
+    keep = np.ones(len(boxes), dtype=bool)
+    if x1 > 0:
+        keep &= boxes[:, 0] > x1 + margin
+    if y1 > 0:
+        keep &= boxes[:, 1] > y1 + margin
+    if x2 < page_w:
+        keep &= boxes[:, 2] < x2 - margin
+    if y2 < page_h:
+        keep &= boxes[:, 3] < y2 - margin
+    return keep
+
+def _stack(detections):
+    detections = [d for d in detections if len(d[0])]
+    if not detections:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    boxes = np.concatenate([b for b, _ in detections]).astype(np.float32)
+    scores = np.concatenate([s for _, s in detections]).astype(np.float32)
+    return boxes, scores
+
+def _intersection(a, b):
+    """Pairwise intersection areas of (N, 4) and (M, 4) boxes"""
+    w = (np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])).clip(min=0)
+    h = (np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])).clip(min=0)
+    return w * h
+
+def stitch_fragments(fragments, whole, min_cover=0.5):
+    """
+    Rebuilds words wider than the tile overlap, which are cut in every tile.
+    Fragments mostly covered by a whole detection are dropped; the rest are
+    unioned with every fragment they overlap (the pieces of one word meet in
+    the overlap band).
+    """
+    if len(fragments) == 0:
+        return fragments
+    areas = ((fragments[:, 2] - fragments[:, 0]) * (fragments[:, 3] - fragments[:, 1])).clip(min=1e-9)
+    if len(whole):
+        covered = _intersection(fragments, whole).max(axis=1) / areas >= min_cover
+        fragments = fragments[~covered]
+    if len(fragments) == 0:
+        return fragments
+
+    # Union-find over overlapping fragments
+    parent = list(range(len(fragments)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    inter = _intersection(fragments, fragments)
+    for i, j in zip(*np.nonzero(np.triu(inter, k=1) > 0)):
+        parent[find(i)] = find(j)
+
+    merged = {}
+    for i, box in enumerate(fragments):
+        root = find(i)
+        if root in merged:
+            m = merged[root]
+            merged[root] = [min(m[0], box[0]), min(m[1], box[1]), max(m[2], box[2]), max(m[3], box[3])]
+        else:
+            merged[root] = list(box)
+    return np.asarray(list(merged.values()), dtype=np.float32).reshape(-1, 4)
+
+def merge_tile_detections(whole, fragments, iou_threshold):
+    """
+    Global NMS over the seam-free detections gathered from all tiles, plus
+    stitched seam fragments no whole detection accounts for.
+    whole, fragments: [(boxes (N, 4) page coords, scores (N,)), ...]
+    Returns the kept boxes as an (M, 4) array.
+    """
+    boxes, scores = _stack(whole)
+    boxes = boxes[nms(boxes, scores, iou_threshold)]
+    stitched = stitch_fragments(_stack(fragments)[0], boxes)
+    return np.concatenate([boxes, stitched])
+
+def assign_boxes_to_tiles(boxes, tiles):
+    """
+    Gives every box to the first tile that fully contains it, so crops can be
+    cut from that tile alone. Boxes no tile contains (larger than the overlap)
+    get their own region: the box itself, rounded outwards.
+    Returns [(region (x1, y1, x2, y2), [box indices]), ...].
+    """
+    groups = {}
+    tiles_arr = np.asarray(tiles, dtype=np.float32).reshape(-1, 4)
+    for i, (bx1, by1, bx2, by2) in enumerate(boxes):
+        inside = ((tiles_arr[:, 0] <= bx1) & (tiles_arr[:, 1] <= by1) &
+                  (tiles_arr[:, 2] >= bx2) & (tiles_arr[:, 3] >= by2))
+        hits = np.flatnonzero(inside)
+        if len(hits):
+            region = tuple(tiles[hits[0]])
+        else:
+            region = (int(np.floor(bx1)), int(np.floor(by1)), int(np.ceil(bx2)), int(np.ceil(by2)))
+        groups.setdefault(region, []).append(i)
+    return list(groups.items())
@@ -0,0 +1,192 @@
+# backend/worker_pool.py
+"""
+Multi-process OCR for many-core machines. The parent loads the models once
+and forks the workers, so every worker maps the same weight pages
+copy-on-write instead of loading its own copy. Each worker gets a slice of
+the CPU threads, which keeps N small CRNN batches running side by side
+instead of one process oversubscribing torch's intra-op pool.
+A worker that dies (e.g. killed by the OOM killer on a huge page) breaks
+the pool; the pool forks fresh workers and re-reads the pages that were in
+flight one at a time, so only a page that kills its worker again fails.
+Unix only (needs fork).
+"""
+import gc
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# The engine of this worker process, set by _init_worker
+_engine = None
+
+def split_threads(processes, cpus=None):
+    """Intra-op threads per worker so processes * threads fits the CPUs"""
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // max(1, processes))
+
+def _init_worker(engine, threads):
+    global _engine
+    import torch
+
+    # engine comes through fork() with the rest of the parent's memory, not pickled
+    _engine = engine
+    torch.set_num_threads(threads)
+    engine.intra_op_threads = threads
+    engine.inter_op_threads = 1
+    # SQLite connections and open trace files must not be shared with the parent
+    engine.result_cache = None
+    engine.profiler = None
+    engine._page = None
+
+    # ONNX Runtime sessions keep thread pools that do not survive a fork; they
+    # are re-created here, so ONNX weights are loaded once per worker
+    from .inference import OnnxCRNN, OnnxDetector
+    if isinstance(engine.yolo_model, OnnxDetector):
+        engine.load_yolo(engine.yolo_path)
+    if isinstance(engine.crnn_model, OnnxCRNN):
+        engine.load_crnn(engine.crnn_path)
+
+def _ocr_group(paths):
+    """
+    Worker entry point. Reads a group of pages with shared YOLO/CRNN batches.
+    Returns [(path, image_size, results, error), ...]; error is None on success.
+    """
+    engine = _engine
+    images, ok = [], []
+    out = {}
+    for path in paths:
+        try:
+            images.append(engine.load_image(path))
+            ok.append(path)
+        except Exception as e:
+            out[path] = (path, None, None, str(e))
+
+    if images:
+        try:
+            boxes = engine.detect_batch(images)
+            results = engine.recognize_batch(images, boxes)
+            for path, image, page_results in zip(ok, images, results):
+                out[path] = (path, image.size, page_results, None)
+        except Exception as e:
+            for path in ok:
+                out[path] = (path, None, None, str(e))
+    return [out[p] for p in paths]
+
+class OCRProcessPool:
+    """
+    Forked worker processes sharing one loaded OCREngine.
+    Use as a context manager, or call close() when done.
+
+    engine: OCREngine with both models loaded; workers see its settings as
+            they were when they were forked (when the pool was created, or
+            after a worker died)
+    processes: worker count (default: one per 4 CPUs, at least 1)
+    threads: intra-op threads per worker (default: CPUs // processes)
+    batch_size: pages per task; they share YOLO and CRNN batches
+    """
+    def __init__(self, engine, processes=None, threads=None, batch_size=1):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("OCRProcessPool needs fork(), which this platform does not have")
+        if not engine.yolo_model or not engine.crnn_model:
+            raise ValueError("Models not loaded")
+
+        cpus = os.cpu_count() or 1
+        self.processes = processes or max(1, cpus // 4)
+        self.threads = threads or split_threads(self.processes, cpus)
+        self.batch_size = max(1, batch_size)
+
+        self.engine = engine
+        self._context = multiprocessing.get_context("fork")
+        self._executor = None
+        self._start()
+
+    def _start(self):
+        """Forks a fresh set of workers"""
+        # Moves everything alive now out of the collector's reach, so a
+        # worker's GC passes don't write to (and un-share) the parent's pages
+        gc.freeze()
+        try:
+            executor = ProcessPoolExecutor(self.processes, mp_context=self._context,
+                                           initializer=_init_worker, initargs=(self.engine, self.threads))
+            try:
+                # The executor forks all its workers on the first submit; do it now, while frozen
+                executor.submit(os.getpid).result()
+            except BaseException:
+                executor.shutdown(wait=False)
+                raise
+        finally:
+            gc.unfreeze()
+        self._executor = executor
+
+    def _restart(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._start()
+
+    def imap(self, image_paths):
+        """
+        Yields (path, image_size, results, error) for every path as the
+        workers finish them, in completion order.
+        """
+        groups = deque(image_paths[i:i + self.batch_size] for i in range(0, len(image_paths), self.batch_size))
+        running = {}
+        while groups or running:
+            # Two groups per worker keep every worker busy without queueing the whole list
+            while groups and len(running) < 2 * self.processes:
+                group = groups.popleft()
+                running[self._executor.submit(_ocr_group, group)] = group
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            lost = []
+            for future in done:
+                group = running.pop(future)
+                try:
+                    yield from future.result()
+                except BrokenProcessPool:
+                    lost.append(group)
+            if lost:
+                # A dead worker fails every group still in the pool, not just its own
+                done, _ = wait(running)
+                for future in done:
+                    group = running.pop(future)
+                    try:
+                        yield from future.result()
+                    except BrokenProcessPool:
+                        lost.append(group)
+                self._restart()
+                yield from self._retry(lost)
+
+    def _retry(self, groups):
+        """
+        Re-reads the pages of groups lost with a dead worker one at a time, so
+        a page that kills its worker again fails alone
+        """
+        for path in (path for group in groups for path in group):
+            try:
+                yield from self._executor.submit(_ocr_group, [path]).result()
+            except BrokenProcessPool:
+                self._restart()
+                yield path, None, None, "Worker process died reading this page (out of memory?)"
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.engine = None
+
+    def terminate(self):
+        """Drops queued pages and kills the workers without waiting for their current pages"""
+        # ProcessPoolExecutor has no terminate() before Python 3.14
+        processes = list((self._executor._processes or {}).values())
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        self.engine = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,77 @@
+# benchmarks/bench_canvas.py
+"""
+Measures canvas frame time with thousands of boxes on a synthetic page:
+panning at several zoom levels, plus the cost of a mode switch (M/R/T).
+Runs headless when QT_QPA_PLATFORM=offscreen is set.
+Run: QT_QPA_PLATFORM=offscreen python -m benchmarks.bench_canvas
+"""
+import argparse
+import statistics
+import time
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QPixmap, QImage
+
+from .synthetic import make_page
+
+def frame_times(view, zoom, frames):
+    """Grabs the viewport `frames` times while panning diagonally at the given zoom"""
+    view.resetTransform()
+    view.scale(zoom, zoom)
+    hbar, vbar = view.horizontalScrollBar(), view.verticalScrollBar()
+    hbar.setValue(hbar.minimum())
+    vbar.setValue(vbar.minimum())
+    step_x = max((hbar.maximum() - hbar.minimum()) // frames, 1)
+    step_y = max((vbar.maximum() - vbar.minimum()) // frames, 1)
+
+    view.viewport().grab() # Warm-up
+    times = []
+    for _ in range(frames):
+        hbar.setValue(hbar.value() + step_x)
+        vbar.setValue(vbar.value() + step_y)
+        start = time.perf_counter()
+        view.viewport().grab()
+        times.append(time.perf_counter() - start)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--boxes", type=int, default=5000)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--zooms", type=float, nargs="+", default=[1.0, 0.5, 0.25, 0.1])
+    args = parser.parse_args()
+
+    app = QApplication([])
+    from ui.box_item import BoxItem
+    from ui.canvas import CanvasView
+
+    # Tall enough for every box to get its own spot
+    height = max(2339, 40 + (args.boxes // 12 + 1) * 52 + 40)
+    page, boxes = make_page(args.boxes, height=height)
+    view = CanvasView()
+    view.resize(1280, 800)
+    view.show()
+    image = QImage(page.tobytes(), page.width, page.height, page.width * 3, QImage.Format.Format_RGB888)
+    view.scene.addPixmap(QPixmap.fromImage(image))
+    view.scene.setSceneRect(0, 0, page.width, page.height)
+
+    start = time.perf_counter()
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        view.add_box(BoxItem(x1, y1, x2 - x1, y2 - y1, f"word {i}"))
+    build = time.perf_counter() - start
+    app.processEvents()
+
+    print(f"{len(boxes)} boxes on a {page.width}x{page.height} page, built in {build * 1000:.0f} ms")
+    for zoom in args.zooms:
+        times = frame_times(view, zoom, args.frames)
+        print(f"zoom {zoom:5.2f}: median {statistics.median(times) * 1000:7.1f} ms/frame, "
+              f"max {max(times) * 1000:7.1f} ms")
+
+    for mode in ("MOVE", "RESIZE", "TEXT", "VIEW"):
+        start = time.perf_counter()
+        view.set_mode(mode)
+        app.processEvents()
+        print(f"mode {mode:6s}: {(time.perf_counter() - start) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_width_buckets.py
+"""
+Compares fixed-width (IMG_WIDTH) and width-bucketed CRNN recognition on a
+synthetic page, using a randomly initialised CRNN on CPU. The default page
+is made of short tokens (numbers, single syllables, initials), the pages
+the bucketed mode is for; --word-width 20 220 gives ordinary prose, where
+most crops fill IMG_WIDTH anyway and the mode gains nothing.
+Run: python -m benchmarks.bench_width_buckets [--word-width MIN MAX]
+"""
+import argparse
+import time
+
+import torch
+
+from MyCRNN import CRNN
+from backend.config import ModelConfig, NUM_CLASSES
+from backend.model_wrapper import OCREngine
+from .synthetic import make_page
+
+def time_mode(engine, page, boxes, variable_width, repeats):
+    engine.variable_width = variable_width
+    groups, _ = engine.prepare_crops(page, boxes)
+    pixels = sum(batch.shape[0] * batch.shape[2] * batch.shape[3] for _, batch in groups.values())
+
+    engine.recognize_batch([page], [boxes]) # Warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        engine.recognize_batch([page], [boxes])
+        best = min(best, time.perf_counter() - start)
+    return best, pixels, sorted(groups)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=1000)
+    parser.add_argument("--word-width", type=int, nargs=2, default=[8, 40], metavar=("MIN", "MAX"),
+                        help="Word widths in pixels on the synthetic page (words are 28-40px tall)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0 = default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    engine = OCREngine()
+    engine.device = 'cpu'
+    engine.crnn_model = CRNN(num_classes=NUM_CLASSES, input_height=ModelConfig.IMG_HEIGHT).eval()
+    page, boxes = make_page(args.words, word_width=tuple(args.word_width))
+
+    fixed_t, fixed_px, _ = time_mode(engine, page, boxes, False, args.repeats)
+    var_t, var_px, widths = time_mode(engine, page, boxes, True, args.repeats)
+
+    print(f"{len(boxes)} crops, buckets used: {widths}")
+    print(f"Fixed width {ModelConfig.IMG_WIDTH}: {fixed_t * 1000:8.1f} ms  {fixed_px / 1e6:6.2f} Mpx")
+    print(f"Bucketed:       {var_t * 1000:8.1f} ms  {var_px / 1e6:6.2f} Mpx")
+    print(f"Speedup: {fixed_t / var_t:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/check_preprocess.py
+"""
+Checks that the batched crop/resize/pad path matches the old per-crop PIL path.
+Run: python -m benchmarks.check_preprocess
+"""
+import argparse
+import sys
+import time
+
+from PIL import Image
+
+from backend.config import ModelConfig
+from backend.model_wrapper import OCREngine
+from .synthetic import make_page
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--words", type=int, default=500)
+    parser.add_argument("--scale", type=int, default=1,
+                        help="Upscale the page, so crops are shrunk this much more (e.g. 3 for 900 dpi scans)")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Max allowed mean absolute difference (normalized units)")
+    parser.add_argument("--p99-tolerance", type=float, default=0.2,
+                        help="Max allowed 99th percentile of the absolute difference")
+    parser.add_argument("--max-tolerance", type=float, default=0.35,
+                        help="Max allowed absolute difference of any pixel")
+    args = parser.parse_args()
+
+    engine = OCREngine()
+    page, boxes = make_page(args.words)
+    if args.scale > 1:
+        page = page.resize((page.width * args.scale, page.height * args.scale), Image.Resampling.BICUBIC)
+        boxes = [[v * args.scale for v in b] for b in boxes]
+
+    t0 = time.perf_counter()
+    ref, ref_boxes = engine.prepare_crops_pil(page, boxes)
+    t1 = time.perf_counter()
+    groups, out_boxes = engine.prepare_crops(page, boxes)
+    t2 = time.perf_counter()
+
+    out = groups[ModelConfig.IMG_WIDTH][1]
+
+    if ref_boxes != out_boxes:
+        sys.exit("FAIL: the two paths kept different boxes")
+    if ref.shape != out.shape:
+        sys.exit(f"FAIL: shape mismatch {tuple(ref.shape)} vs {tuple(out.shape)}")
+
+    diff = (ref - out).abs()
+    mean_diff = diff.mean().item()
+    p99_diff = diff.flatten().quantile(0.99).item()
+    max_diff = diff.max().item()
+    print(f"{len(out_boxes)} crops -> {tuple(out.shape)}")
+    print(f"PIL path:     {(t1 - t0) * 1000:.1f} ms")
+    print(f"Batched path: {(t2 - t1) * 1000:.1f} ms")
+    print(f"Mean |diff| {mean_diff:.4f}, p99 |diff| {p99_diff:.4f}, max |diff| {max_diff:.4f}")
+
+    failures = [f"{name} difference {value:.4f} above {limit}" for name, value, limit in (
+        ("mean", mean_diff, args.tolerance),
+        ("p99", p99_diff, args.p99_tolerance),
+        ("max", max_diff, args.max_tolerance),
+    ) if value > limit]
+    if failures:
+        sys.exit(f"FAIL: {'; '.join(failures)}")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/check_worker_pool.py
+"""
+Checks that OCRProcessPool survives a worker being killed mid-page (as the
+OOM killer would on a huge page): every other page must still be read, and
+a page that kills its worker every time must come back as an error, not hang.
+Run: python -m benchmarks.check_worker_pool
+"""
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from MyCRNN import CRNN
+from backend.config import ModelConfig, NUM_CLASSES
+from backend.model_wrapper import OCREngine
+from backend.worker_pool import OCRProcessPool
+from .synthetic import make_page
+
+# Pages of this size kill the worker reading them
+POISON_SIZE = (333, 333)
+
+class KillingDetector:
+    """
+    Returns fixed boxes, but SIGKILLs its own process on a poison-sized page:
+    always, or only the first time when once_flag names a file to create
+    """
+    def __init__(self, boxes, once_flag=None):
+        self.boxes = boxes
+        self.once_flag = once_flag
+
+    def detect(self, images, conf, iou):
+        if any(image.size == POISON_SIZE for image in images):
+            if self.once_flag is None or not os.path.exists(self.once_flag):
+                if self.once_flag is not None:
+                    open(self.once_flag, "w").close()
+                os.kill(os.getpid(), signal.SIGKILL)
+        return [[list(b) for b in self.boxes] for _ in images]
+
+def run_pool(engine, paths, processes, batch_size):
+    start = time.perf_counter()
+    with OCRProcessPool(engine, processes, threads=1, batch_size=batch_size) as pool:
+        out = {path: (results, error) for path, size, results, error in pool.imap(paths)}
+    return out, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--timeout", type=int, default=300,
+                        help="Fail if the pool takes longer than this many seconds (a hang)")
+    args = parser.parse_args()
+
+    def on_timeout(signum, frame):
+        sys.exit(f"FAIL: the pool hung for {args.timeout}s")
+    signal.signal(signal.SIGALRM, on_timeout)
+    signal.alarm(args.timeout)
+
+    page, boxes = make_page(20, width=600, height=400)
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        for i in range(args.pages):
+            path = os.path.join(workdir, f"page{i}.png")
+            (page if i != args.pages // 2 else page.resize(POISON_SIZE)).save(path)
+            paths.append(path)
+        poison = paths[args.pages // 2]
+
+        engine = OCREngine()
+        engine.device = 'cpu'
+        engine.crnn_model = CRNN(num_classes=NUM_CLASSES, input_height=ModelConfig.IMG_HEIGHT).eval()
+
+        for name, once_flag in [("worker killed once", os.path.join(workdir, "killed")),
+                                ("worker killed on every try", None)]:
+            engine.yolo_model = KillingDetector(boxes, once_flag)
+            out, seconds = run_pool(engine, paths, args.processes, args.batch_size)
+
+            missing = [p for p in paths if p not in out]
+            errors = [p for p in paths if p in out and out[p][1] is not None]
+            expected = [] if once_flag else [poison]
+            ok = not missing and errors == expected
+            failed |= not ok
+            print(f"{name:28s} {len(paths) - len(missing) - len(errors)}/{len(paths)} read, "
+                  f"{len(errors)} errors, {seconds:.1f}s  {'OK' if ok else 'FAIL'}")
+            for path in errors:
+                print(f"  {os.path.basename(path)}: {out[path][1]}")
+
+    signal.alarm(0)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# benchmarks/suite.py
+"""
+Benchmarks every hot path on synthetic pages with randomly initialised models,
+so it runs offline on CPU. Results go to JSON; compare mode fails (exit 1)
+when a benchmark got slower than a baseline by more than a threshold.
+Run:     python -m benchmarks.suite run -o bench.json [--words 1000]
+Compare: python -m benchmarks.suite compare baseline.json bench.json [--threshold 0.15]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+
+from MyCRNN import CRNN
+from backend.config import ModelConfig, NUM_CLASSES
+from backend.exporter import save_to_voc_xml, save_to_yolo
+from backend.geometry import sort_boxes_into_lines
+from backend.image_ops import ResizeAndPad
+from backend.model_wrapper import OCREngine
+from backend.spatial_index import BoxIndex
+from .synthetic import make_page
+
+class SyntheticDetector:
+    """
+    Returns the synthetic page's true boxes, so the CRNN half of a run always
+    sees a realistic word count. With ultralytics installed, a YOLOv8n built
+    from its yaml (random weights, nothing downloaded) still runs on every
+    call, so detection cost is part of the timing.
+    """
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.yolo = None
+        try:
+            from backend.inference import UltralyticsDetector
+            self.yolo = UltralyticsDetector("yolov8n.yaml")
+        except ImportError:
+            pass
+
+    @property
+    def name(self):
+        return "yolov8n (random weights)" if self.yolo else "none (ground-truth boxes only)"
+
+    def detect(self, images, conf, iou):
+        if self.yolo is not None:
+            self.yolo.detect(images, conf, iou)
+        return [[list(b) for b in self.boxes] for _ in images]
+
+def time_call(fn, repeats, warmup=1):
+    """Runs fn warmup + repeats times; returns per-call seconds of the timed runs"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+def build_benchmarks(words, workdir):
+    """{name: zero-argument callable}, sharing one synthetic page and one engine"""
+    page, boxes = make_page(words)
+    page_path = os.path.join(workdir, "page.png")
+    page.save(page_path)
+
+    engine = OCREngine()
+    engine.device = 'cpu'
+    engine.crnn_model = CRNN(num_classes=NUM_CLASSES, input_height=ModelConfig.IMG_HEIGHT).eval()
+    engine.yolo_model = SyntheticDetector(boxes)
+
+    crops = [page.crop(tuple(int(v) for v in b)) for b in boxes]
+    resize = ResizeAndPad(ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH)
+    with torch.no_grad():
+        logits = engine.crnn_model(torch.zeros(1, 3, ModelConfig.IMG_HEIGHT, ModelConfig.IMG_WIDTH))
+    steps = logits.shape[0]
+    preds = torch.randn(steps, len(boxes), NUM_CLASSES)
+    results = [{'bbox': b, 'text': f"word{i}"} for i, b in enumerate(boxes)]
+    groups, _ = engine.prepare_crops(page, boxes)
+    batch = next(iter(groups.values()))[1]
+
+    def run_e2e():
+        engine.forget_page(page_path) # Decode, detect and read the page every time
+        engine.run(page_path)
+
+    def box_index():
+        index = BoxIndex()
+        for i, b in enumerate(boxes):
+            index.insert(i, b)
+        index.overlapping_pairs()
+
+    benchmarks = {
+        'resize_and_pad': lambda: [resize(c) for c in crops],
+        'prepare_crops': lambda: engine.prepare_crops(page, boxes),
+        'crnn_forward': lambda: engine.recognize_tensors(batch),
+        'decode_predictions': lambda: engine.decode_predictions(preds),
+        'sort_boxes_into_lines': lambda: sort_boxes_into_lines(results),
+        'save_to_yolo': lambda: save_to_yolo(results, page.width, page.height,
+                                             os.path.join(workdir, "page.txt")),
+        'save_to_voc_xml': lambda: save_to_voc_xml(results, "page.png", page.size,
+                                                   os.path.join(workdir, "page.xml")),
+        'box_index_overlaps': box_index,
+        'run_e2e': run_e2e,
+    }
+    return benchmarks, engine.yolo_model.name
+
+def cmd_run(args):
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks, detector = build_benchmarks(args.words, workdir)
+        selected = args.only or list(benchmarks)
+
+        results = {}
+        for name in selected:
+            times = time_call(benchmarks[name], args.repeats)
+            results[name] = {
+                'median_ms': statistics.median(times) * 1000,
+                'min_ms': min(times) * 1000,
+                'mean_ms': statistics.fmean(times) * 1000,
+                'repeats': args.repeats,
+            }
+            print(f"{name:24s} median {results[name]['median_ms']:9.2f} ms   min {results[name]['min_ms']:9.2f} ms")
+
+    report = {
+        'meta': {
+            'words': args.words,
+            'detector': detector,
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'machine': platform.platform(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.output}")
+    return 0
+
+def compare(baseline, current, threshold, metric="median_ms"):
+    """
+    Returns [(name, base, now, ratio, regressed), ...] for benchmarks in both
+    reports. A benchmark regresses when now > base * (1 + threshold).
+    """
+    rows = []
+    for name, base in baseline['results'].items():
+        now = current['results'].get(name)
+        if now is None:
+            continue
+        ratio = now[metric] / base[metric] if base[metric] > 0 else float('inf')
+        rows.append((name, base[metric], now[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+def cmd_compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline['meta'].get('words') != current['meta'].get('words'):
+        print(f"Warning: word counts differ ({baseline['meta'].get('words')} vs "
+              f"{current['meta'].get('words')})", file=sys.stderr)
+
+    rows = compare(baseline, current, args.threshold, args.metric)
+    for name, base, now, ratio, regressed in rows:
+        flag = "REGRESSED" if regressed else ""
+        print(f"{name:24s} {base:9.2f} -> {now:9.2f} ms  {ratio:5.2f}x  {flag}")
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"Not in current run: {', '.join(missing)}")
+
+    regressions = [r[0] for r in rows if r[4]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Run the benchmarks")
+    p.add_argument("-o", "--output", help="Write results to this JSON file")
+    p.add_argument("--words", type=int, default=1000, help="Words on the synthetic page")
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--threads", type=int, default=0, help="torch threads (0 = default)")
+    p.add_argument("--only", nargs="+", help="Run just these benchmarks")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("compare", help="Fail when current results regressed against a baseline")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=0.15,
+                   help="Allowed slowdown as a fraction (0.15 = 15%%)")
+    p.add_argument("--metric", choices=["median_ms", "min_ms", "mean_ms"], default="median_ms")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# benchmarks/synthetic.py
+import random
+
+from PIL import Image, ImageDraw, ImageFilter
+
+def make_page(num_words=200, width=1654, height=2339, seed=0, word_width=(20, 220)):
+    """
+    Draws a fake text page: rows of dark word-like blobs on a light background.
+    word_width: (min, max) word width in pixels, on 28-40px tall words.
+    Returns (PIL image, [[x1, y1, x2, y2], ...]) with one box per word.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (235, 232, 225))
+    draw = ImageDraw.Draw(image)
+    boxes = []
+
+    line_h = 40
+    x, y = 40, 40
+    while len(boxes) < num_words:
+        w = rng.randint(*word_width)
+        if x + w > width - 40:
+            x, y = 40, y + line_h + 12
+            if y + line_h > height - 40:
+                y = 40 # Wrap around: overlapping rows are fine for benchmarks
+        h = rng.randint(line_h - 12, line_h)
+        top = y + (line_h - h)
+        # A few strokes per word so resizing has real edges to preserve
+        for sx in range(x, x + w, 7):
+            draw.rectangle([sx, top + rng.randint(0, 8), sx + 3, top + h - rng.randint(0, 8)], fill=(20, 20, 30))
+        boxes.append([x - 2.5, top - 2.5, x + w + 2.5, top + h + 2.5])
+        x += w + rng.randint(10, 30)
+
+    return image.filter(ImageFilter.GaussianBlur(0.8)), boxes
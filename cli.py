@@ -0,0 +1,394 @@
+# cli.py
+"""Headless entry point. Run `python cli.py --help` for the available commands."""
+import argparse
+import os
+import sys
+
+from backend.annotation_index import AnnotationIndex
+from backend.cache import CropCache, ResultCache
+from backend.config import ModelConfig, ProjectConfig
+from backend.metrics import Profiler
+from backend.model_wrapper import OCREngine
+from backend.pipeline import AnnotationPipeline, list_images
+
+
+def load_engine(args, fast_cpu=False, project="."):
+    """Builds an OCREngine and loads both models, exiting on failure"""
+    engine = OCREngine(intra_op_threads=args.threads, inter_op_threads=args.inter_op_threads)
+    engine.fast_cpu = fast_cpu
+    engine.crnn_batch_budget_mb = args.crnn_batch_budget
+    if getattr(args, 'crnn_batch_size', None):
+        ModelConfig.CRNN_BATCH_SIZE = args.crnn_batch_size
+        engine.calibration_path = None # An explicit size wins over the calibrated one
+    else:
+        engine.calibration_path = os.path.join(project, ProjectConfig.CALIBRATION_PATH)
+    for loader, path in ((engine.load_yolo, args.yolo), (engine.load_crnn, args.crnn)):
+        success, msg = loader(path)
+        if not success:
+            sys.exit(f"Error: {msg}")
+    return engine
+
+
+def cmd_annotate(args):
+    image_paths = list_images(args.input)
+    if not image_paths:
+        sys.exit(f"No images found in {args.input}")
+
+    engine = load_engine(args, fast_cpu=args.fast_cpu, project=args.output)
+    engine.variable_width = args.variable_width
+    engine.tiled = args.tiled
+    engine.tile_batch_budget_mb = args.tile_batch_budget
+    if args.cache:
+        engine.result_cache = ResultCache(os.path.join(args.output, ProjectConfig.CACHE_PATH), args.cache_size)
+    if args.dedup_crops:
+        engine.crop_cache = CropCache(mode=args.dedup_crops)
+    if args.metrics or args.trace:
+        engine.profiler = Profiler(args.metrics, args.trace)
+
+    def on_page(path, num_words):
+        if args.verbose:
+            print(f"{path}: {num_words} words")
+
+    index = AnnotationIndex(os.path.join(args.output, ProjectConfig.INDEX_PATH))
+    pipeline = AnnotationPipeline(engine, args.output, queue_size=args.queue_size,
+                                  batch_size=args.batch_size, on_page=on_page, annotation_index=index)
+    if args.processes:
+        from backend.worker_pool import OCRProcessPool
+        with OCRProcessPool(engine, args.processes, threads=args.threads or None,
+                            batch_size=args.batch_size) as pool:
+            if args.verbose:
+                print(f"{pool.processes} worker processes x {pool.threads} threads")
+            stats = pipeline.run_pool(image_paths, pool)
+    else:
+        stats = pipeline.run(image_paths)
+    index.close()
+    if engine.profiler is not None:
+        engine.profiler.close()
+
+    for path, err in stats['errors']:
+        print(f"Error: {path}: {err}", file=sys.stderr)
+
+    print(f"Processed {stats['images']} images ({stats['words']} words, "
+          f"{stats['empty']} without text, {len(stats['errors'])} failed) "
+          f"in {stats['seconds']:.1f}s -> {stats['images_per_sec']:.2f} images/sec")
+    if engine.crop_cache is not None and not args.processes:
+        crops = engine.crop_cache.stats()
+        print(f"Crop cache: {crops['hit_rate']:.0%} hit rate, {crops['entries']} distinct crops")
+    return 1 if stats['errors'] else 0
+
+
+def cmd_calibrate(args):
+    from backend.calibration import calibrate_crnn, calibration_key, save_calibration
+
+    engine = OCREngine(intra_op_threads=args.threads)
+    engine.fast_cpu = args.fast_cpu
+    engine.calibration_path = None # Measure from the configured defaults
+    success, msg = engine.load_crnn(args.crnn)
+    if not success:
+        sys.exit(f"Error: {msg}")
+
+    budget = args.crnn_batch_budget
+    print(f"Calibrating {os.path.basename(args.crnn)} on {engine.device} "
+          f"({ModelConfig.IMG_HEIGHT}x{ModelConfig.IMG_WIDTH} crops, {budget} MB budget)")
+
+    def on_result(batch_size, crops_per_sec, peak_mb):
+        peak = f"{peak_mb:8.1f} MB" if peak_mb is not None else "       ?"
+        print(f"  batch {batch_size:5d}: {crops_per_sec:9.0f} crops/sec, peak {peak}")
+
+    try:
+        entry = calibrate_crnn(engine, budget, repeats=args.repeats, on_result=on_result)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    path = os.path.join(args.project, ProjectConfig.CALIBRATION_PATH)
+    save_calibration(path, calibration_key(engine), entry)
+
+    engine.calibration = entry
+    widest = max(ModelConfig.WIDTH_BUCKETS)
+    print(f"Batch size {entry['batch_size']} ({entry['crops_per_sec']:.0f} crops/sec), "
+          f"{entry['activation_bytes_per_pixel']:.0f} bytes per crop pixel; "
+          f"{widest}px crops run {engine.crnn_batch_size(widest)} at a time. Saved to {path}")
+    return 0
+
+
+def cmd_export_onnx(args):
+    from backend.onnx_export import export_crnn, export_yolo
+
+    if not args.yolo and not args.crnn:
+        sys.exit("Nothing to export: pass --yolo and/or --crnn")
+    if args.crnn:
+        out = args.crnn_out or os.path.splitext(args.crnn)[0] + ".onnx"
+        print(f"CRNN -> {export_crnn(args.crnn, out, opset=args.opset)}")
+    if args.yolo:
+        out = args.yolo_out or os.path.splitext(args.yolo)[0] + ".onnx"
+        print(f"YOLO -> {export_yolo(args.yolo, out, imgsz=args.imgsz)}")
+    return 0
+
+
+def cmd_compare_crnn(args):
+    from backend.evaluation import compare_models, load_labeled_crops
+    from backend.model_wrapper import build_crnn
+    from backend.optimize import optimize_crnn_for_cpu
+
+    samples = load_labeled_crops(args.crops)
+    if not samples:
+        sys.exit(f"No labeled crops found in {args.crops}")
+
+    # The models are built directly, so the engine never applies --threads itself
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    engine = OCREngine(intra_op_threads=args.threads)
+    float_model = build_crnn(args.crnn, 'cpu')
+    fast_model = optimize_crnn_for_cpu(float_model, quantize=not args.no_quantize,
+                                       channels_last=not args.no_channels_last)
+    r = compare_models(engine, float_model, fast_model, samples)
+
+    print(f"{r['samples']} crops")
+    print(f"Float CRNN:    CER {r['reference_cer']:.4f}  forward {r['reference_seconds']:.2f}s")
+    print(f"Fast CPU CRNN: CER {r['candidate_cer']:.4f}  forward {r['candidate_seconds']:.2f}s")
+    print(f"Fast vs float output CER {r['disagreement_cer']:.4f}, "
+          f"speedup {r['reference_seconds'] / max(r['candidate_seconds'], 1e-9):.2f}x")
+    return 0
+
+
+def cmd_export_dataset(args):
+    from backend.dataset_export import export_word_shards, find_annotated_pages
+
+    xml_paths = find_annotated_pages(args.project)
+    if not xml_paths:
+        sys.exit(f"No annotated pages found in {os.path.join(args.project, 'xml_labels')}")
+
+    def on_page(path, num_words):
+        if args.verbose:
+            print(f"{path}: {num_words} words")
+
+    stats = export_word_shards(xml_paths, args.images, args.output, shard_size=args.shard_size,
+                               height=args.height, image_format=args.format, workers=args.workers,
+                               on_page=on_page)
+
+    for xml_path in stats['missing']:
+        print(f"Warning: no image for {xml_path}", file=sys.stderr)
+    for path, err in stats['errors']:
+        print(f"Error: {path}: {err}", file=sys.stderr)
+    print(f"Wrote {stats['words']} words from {stats['pages']} pages into {len(stats['shards'])} shards "
+          f"in {stats['seconds']:.1f}s -> {stats['words_per_sec']:.0f} words/sec")
+    return 1 if stats['errors'] else 0
+
+
+def cmd_cache(args):
+    path = os.path.join(args.project, ProjectConfig.CACHE_PATH)
+    if not os.path.exists(path):
+        print(f"No cache at {path}")
+        return 0
+
+    cache = ResultCache(path)
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {path}")
+    else:
+        stats = cache.stats()
+        print(f"{stats['path']}: {stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB of results")
+    cache.close()
+    return 0
+
+
+def cmd_index(args):
+    index = AnnotationIndex(os.path.join(args.project, ProjectConfig.INDEX_PATH))
+    if args.action == "sync":
+        updated, removed = index.sync(args.project)
+        print(f"Indexed {updated} changed pages, dropped {removed}")
+    elif args.action == "search":
+        if not args.word:
+            sys.exit("search needs a word")
+        hits = index.pages_with_word(args.word, prefix=args.prefix, limit=args.limit)
+        for page, count in hits:
+            print(f"{page}\t{count}")
+        if not hits:
+            print(f"No pages contain {args.word}", file=sys.stderr)
+    else:
+        stats = index.stats()
+        print(f"{stats['path']}: {stats['pages']} pages, {stats['words']} words "
+              f"({stats['distinct_words']} distinct)")
+    index.close()
+    return 0
+
+
+def cmd_serve(args):
+    from backend.service import OCRServer, UnixOCRServer
+
+    engine = load_engine(args, fast_cpu=args.fast_cpu, project=args.project)
+    engine.variable_width = args.variable_width
+    engine.tiled = args.tiled
+    if args.cache:
+        engine.result_cache = ResultCache(os.path.join(args.project, ProjectConfig.CACHE_PATH), args.cache_size)
+    if args.dedup_crops:
+        engine.crop_cache = CropCache(mode=args.dedup_crops)
+    if args.metrics or args.trace:
+        engine.profiler = Profiler(args.metrics, args.trace)
+    engine.warm_up()
+
+    max_wait = args.max_wait_ms / 1000
+    if args.socket:
+        server = UnixOCRServer(engine, args.socket, args.max_batch, max_wait, args.verbose)
+        where = f"unix://{os.path.abspath(args.socket)}"
+    else:
+        server = OCRServer(engine, args.host, args.port, args.max_batch, max_wait, args.verbose)
+        where = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving OCR on {where} (batches of up to {args.max_batch} pages, {args.max_wait_ms:g} ms wait)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if engine.profiler is not None:
+            engine.profiler.close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Auto-OCR annotation tool (headless)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("annotate", help="Pre-annotate every image in a directory")
+    p.add_argument("input", help="Directory of .png/.jpg/.jpeg images")
+    p.add_argument("--yolo", required=True, help="YOLO weights (.pt or .onnx)")
+    p.add_argument("--crnn", required=True, help="CRNN checkpoint (.pth/.pt or .onnx)")
+    p.add_argument("-o", "--output", default=".",
+                   help="Project directory; labels go to data/labels and xml_labels inside it")
+    p.add_argument("--batch-size", type=int, default=ModelConfig.YOLO_BATCH_SIZE,
+                   help="Pages per YOLO call; their crops share CRNN batches")
+    p.add_argument("--crnn-batch-size", type=int,
+                   help=f"Crops per CRNN forward pass (default: the calibrated size, else "
+                        f"{ModelConfig.CRNN_BATCH_SIZE})")
+    p.add_argument("--crnn-batch-budget", type=int, default=ModelConfig.CRNN_BATCH_BUDGET_MB,
+                   help="MB of crops and CRNN activations per forward pass; caps the batch size")
+    p.add_argument("--fast-cpu", action="store_true",
+                   help="Load the CRNN fused, int8-quantized and channels-last")
+    p.add_argument("--variable-width", action="store_true",
+                   help="Pad short crops to narrower width buckets instead of to 64px (fewer CRNN pixels)")
+    p.add_argument("--tiled", action="store_true",
+                   help="Detect and recognize tile by tile at native resolution (very large scans)")
+    p.add_argument("--tile-batch-budget", type=int, default=ModelConfig.TILE_BATCH_BUDGET_MB,
+                   help="MB of tile tensors kept in flight with --tiled (the decoded page comes on top)")
+    p.add_argument("--cache", action="store_true",
+                   help="Reuse/store results in the project's OCR cache (data/ocr_cache.sqlite)")
+    p.add_argument("--cache-size", type=int, default=ProjectConfig.CACHE_MAX_ENTRIES,
+                   help="Max cached pages before least-recently-used ones are evicted")
+    p.add_argument("--dedup-crops", nargs="?", const="exact", choices=CropCache.MODES,
+                   help="Read repeated word crops once (default mode: exact; perceptual also "
+                        "matches near-identical scans)")
+    p.add_argument("--queue-size", type=int, default=8, help="Max page groups buffered between stages")
+    p.add_argument("--processes", type=int, default=0,
+                   help="Fork this many OCR worker processes sharing the loaded models (Unix; "
+                        "--threads is then per process, default CPUs / processes). "
+                        "--metrics/--trace only cover the parent")
+    p.add_argument("--metrics", metavar="JSONL",
+                   help="Append per-batch stage timings, peak memory and box counts to this file")
+    p.add_argument("--trace", metavar="JSON",
+                   help="Write a Chrome trace-event file (open in chrome://tracing or ui.perfetto.dev)")
+    p.add_argument("-v", "--verbose", action="store_true", help="Print one line per page")
+    p.add_argument("--threads", type=int, default=ModelConfig.INTRA_OP_THREADS,
+                   help="Intra-op threads for torch/ONNX Runtime (0 = library default)")
+    p.add_argument("--inter-op-threads", type=int, default=ModelConfig.INTER_OP_THREADS,
+                   help="Inter-op threads for ONNX Runtime (0 = library default)")
+    p.set_defaults(func=cmd_annotate)
+
+    p = sub.add_parser("serve", help="Serve OCR to many clients (GUIs, scripts) from one set of loaded models")
+    p.add_argument("--yolo", required=True, help="YOLO weights (.pt or .onnx)")
+    p.add_argument("--crnn", required=True, help="CRNN checkpoint (.pth/.pt or .onnx)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    p.add_argument("--max-batch", type=int, default=8, help="Max pages merged into one batch")
+    p.add_argument("--max-wait-ms", type=float, default=10,
+                   help="How long the first page of a batch waits for others to join")
+    p.add_argument("--fast-cpu", action="store_true",
+                   help="Load the CRNN fused, int8-quantized and channels-last")
+    p.add_argument("--variable-width", action="store_true",
+                   help="Pad short crops to narrower width buckets instead of to 64px (fewer CRNN pixels)")
+    p.add_argument("--tiled", action="store_true",
+                   help="Detect and recognize tile by tile at native resolution (very large scans)")
+    p.add_argument("--crnn-batch-budget", type=int, default=ModelConfig.CRNN_BATCH_BUDGET_MB,
+                   help="MB of crops and CRNN activations per forward pass; caps the batch size")
+    p.add_argument("--cache", action="store_true",
+                   help="Reuse/store results of path requests in the OCR cache under --project")
+    p.add_argument("--cache-size", type=int, default=ProjectConfig.CACHE_MAX_ENTRIES,
+                   help="Max cached pages before least-recently-used ones are evicted")
+    p.add_argument("--dedup-crops", nargs="?", const="exact", choices=CropCache.MODES,
+                   help="Read repeated word crops once (default mode: exact; perceptual also "
+                        "matches near-identical scans)")
+    p.add_argument("--project", default=".",
+                   help="Directory holding data/ocr_cache.sqlite and data/crnn_calibration.json")
+    p.add_argument("--metrics", metavar="JSONL", help="Append per-batch stage metrics to this file")
+    p.add_argument("--trace", metavar="JSON", help="Write a Chrome trace-event file")
+    p.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    p.add_argument("--threads", type=int, default=ModelConfig.INTRA_OP_THREADS,
+                   help="Intra-op threads for torch/ONNX Runtime (0 = library default)")
+    p.add_argument("--inter-op-threads", type=int, default=ModelConfig.INTER_OP_THREADS,
+                   help="Inter-op threads for ONNX Runtime (0 = library default)")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("calibrate", help="Find the fastest CRNN batch size for this machine and save it")
+    p.add_argument("--crnn", required=True, help="CRNN checkpoint (.pth/.pt or .onnx)")
+    p.add_argument("--fast-cpu", action="store_true",
+                   help="Calibrate the fused, int8-quantized CRNN (use with annotate/serve --fast-cpu)")
+    p.add_argument("--crnn-batch-budget", type=int, default=ModelConfig.CRNN_BATCH_BUDGET_MB,
+                   help="MB a CRNN forward pass may use; larger batches are not tried")
+    p.add_argument("--repeats", type=int, default=3, help="Timed forward passes per batch size")
+    p.add_argument("--project", default=".", help="Directory to save data/crnn_calibration.json in")
+    p.add_argument("--threads", type=int, default=ModelConfig.INTRA_OP_THREADS,
+                   help="Intra-op threads, as annotate/serve will use them (0 = library default)")
+    p.set_defaults(func=cmd_calibrate)
+
+    p = sub.add_parser("export-dataset", help="Crop every annotated word into tar shards for CRNN training")
+    p.add_argument("images", help="Directory holding the annotated images")
+    p.add_argument("-o", "--output", required=True, help="Directory for the shards and manifest.json")
+    p.add_argument("--project", default=".", help="Project directory holding xml_labels/")
+    p.add_argument("--shard-size", type=int, default=10000, help="Words per shard")
+    p.add_argument("--height", type=int, help="Resize crops to this height, keeping aspect (default: native size)")
+    p.add_argument("--format", choices=["PNG", "JPEG", "WEBP"], default="PNG", help="Crop encoding")
+    p.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    p.add_argument("-v", "--verbose", action="store_true", help="Print one line per page")
+    p.set_defaults(func=cmd_export_dataset)
+
+    p = sub.add_parser("cache", help="Inspect or clear the OCR result cache")
+    p.add_argument("action", choices=["stats", "clear"])
+    p.add_argument("--project", default=".", help="Project directory holding data/ocr_cache.sqlite")
+    p.set_defaults(func=cmd_cache)
+
+    p = sub.add_parser("index", help="Sync, query or inspect the project's annotation index")
+    p.add_argument("action", choices=["sync", "search", "stats"])
+    p.add_argument("word", nargs="?", help="Word to look for (search)")
+    p.add_argument("--project", default=".", help="Project directory holding xml_labels/ and data/")
+    p.add_argument("--prefix", action="store_true", help="Match every word starting with WORD")
+    p.add_argument("--limit", type=int, help="Max pages to list")
+    p.set_defaults(func=cmd_index)
+
+    p = sub.add_parser("compare-crnn", help="Accuracy/speed of the fast CPU CRNN vs the float model")
+    p.add_argument("crops", help="Folder of word crops with labels.txt or per-image .txt labels")
+    p.add_argument("--crnn", required=True, help="CRNN .pth/.pt checkpoint")
+    p.add_argument("--threads", type=int, default=ModelConfig.INTRA_OP_THREADS,
+                   help="torch intra-op threads (0 = library default)")
+    p.add_argument("--no-quantize", action="store_true", help="Skip int8 dynamic quantization")
+    p.add_argument("--no-channels-last", action="store_true", help="Keep the default memory layout")
+    p.set_defaults(func=cmd_compare_crnn)
+
+    p = sub.add_parser("export-onnx", help="Convert .pt/.pth checkpoints to ONNX")
+    p.add_argument("--yolo", help="YOLO .pt weights")
+    p.add_argument("--crnn", help="CRNN .pth/.pt checkpoint")
+    p.add_argument("--yolo-out", help="Output path (default: next to the input)")
+    p.add_argument("--crnn-out", help="Output path (default: next to the input)")
+    p.add_argument("--imgsz", type=int, default=ModelConfig.YOLO_IMGSZ, help="YOLO input size")
+    p.add_argument("--opset", type=int, default=17, help="ONNX opset for the CRNN")
+    p.set_defaults(func=cmd_export_onnx)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
 # main.py
+import argparse
+import os
 import sys
 from PyQt6.QtWidgets import QApplication
 from ui.main_window import MainWindow
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Auto-OCR annotation tool")
+    parser.add_argument("--service", default=os.environ.get("AUTO_OCR_SERVICE"),
+                        help="Use a running `cli.py serve` (http://host:port or unix:///path) "
+                             "instead of loading models in this process")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # Load Styles
     with open("styles.qss", "r") as f:
         app.setStyleSheet(f.read())
         
-    window = MainWindow()
+    window = MainWindow(service_url=args.service)
     window.show()
     
     sys.exit(app.exec())
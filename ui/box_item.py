@@ -1,7 +1,7 @@
 # ui/box_item.py
-from PyQt6.QtWidgets import QGraphicsRectItem, QGraphicsTextItem, QGraphicsItem, QInputDialog
-from PyQt6.QtCore import Qt, QRectF
-from PyQt6.QtGui import QPen, QBrush, QColor, QFont
+from PyQt6.QtWidgets import QGraphicsRectItem, QGraphicsItem, QStyleOptionGraphicsItem, QInputDialog
+from PyQt6.QtCore import Qt, QRectF, QPointF
+from PyQt6.QtGui import QPen, QBrush, QColor, QFont, QFontMetricsF, QPainter, QStaticText
 
 class HandleItem(QGraphicsRectItem):
     """Small square handle for resizing"""
@@ -11,10 +11,10 @@ class HandleItem(QGraphicsRectItem):
         self.setCursor(cursor_shape)
         self.setBrush(QBrush(QColor("yellow")))
         self.setPen(QPen(QColor("black"), 1))
-        
+
         # CRITICAL: High Z-Value ensures it floats on top of the box and text
-        self.setZValue(999) 
-        self.setAcceptHoverEvents(True) 
+        self.setZValue(999)
+        self.setAcceptHoverEvents(True)
 
     def mousePressEvent(self, event):
         # Trigger parent resize
@@ -30,38 +30,107 @@ class HandleItem(QGraphicsRectItem):
 class BoxItem(QGraphicsRectItem):
     MIN_SIZE = 10.0 # Minimum width/height in pixels
 
+    # Shared by every box: thousands of boxes should not mean thousands of pens/fonts
+    DEFAULT_PEN = QPen(QColor("#00FF00"), 2)
+    SELECTED_PEN = QPen(QColor("#FF0000"), 3)
+    FLAGGED_PEN = QPen(QColor("#FF8C00"), 2, Qt.PenStyle.DashLine)
+    LABEL_COLOR = QColor("yellow")
+    LABEL_OFFSET = QPointF(4, -21) # Where the old QGraphicsTextItem label used to sit
+
+    # Zoomed out below this labels are skipped (the canvas takes over drawing
+    # boxes altogether further out, see CanvasView.SIMPLE_ZOOM)
+    LABEL_MIN_LOD = 0.4
+
+    CURSORS = {
+        'MOVE': Qt.CursorShape.OpenHandCursor,
+        'TEXT': Qt.CursorShape.IBeamCursor,
+    }
+
+    _font = None
+    _metrics = None
+
+    @classmethod
+    def label_font(cls):
+        # Built lazily: a QFont needs the QApplication to exist
+        if cls._font is None:
+            cls._font = QFont("Arial", 12)
+            cls._font.setBold(True)
+            cls._metrics = QFontMetricsF(cls._font)
+        return cls._font
+
     def __init__(self, x, y, w, h, text, parent=None):
         # Initialize the rect at the specific coordinates
         super().__init__(x, y, w, h, parent)
-        
+
         # 1. Visual Setup
-        self.default_pen = QPen(QColor("#00FF00"), 2)
-        self.selected_pen = QPen(QColor("#FF0000"), 3)
-        self.setPen(self.default_pen)
-        
+        self.setPen(self.DEFAULT_PEN) # Only used for shape(); paint() picks its own pen
+
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
+        # Always movable; mouseMoveEvent only lets the drag through in MOVE mode
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
         self.setAcceptHoverEvents(True)
-        
-        # 2. Text Label
-        self.text_item = QGraphicsTextItem(text, self)
-        self.text_item.setDefaultTextColor(QColor("yellow"))
-        font = QFont("Arial", 12)
-        font.setBold(True)
-        self.text_item.setFont(font)
-        self.text_item.setZValue(1) 
-
-        # 3. Resize Handles
+
+        # 2. Text Label, drawn in paint() from a cached layout
+        self._text = ""
+        self._label = QStaticText()
+        self._label.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+        self._label_rect = QRectF()
+        self._bounds = QRectF()
+        self.set_text(text)
+
+        # 3. Resize Handles, only while this box is selected in RESIZE mode
         self.handles = {}
-        self.create_handles()
-        
+
         # 4. State Management
         self.resizing = False
         self.current_handle = None
-        self.current_mode = "VIEW" 
-        
-        # CRITICAL FIX: Ensure handles are positioned correctly immediately
-        self.update_handles_pos()
-        self.update_text_pos()
+        # Set once the user types the text; re-recognition never overwrites it
+        self.text_edited = False
+        # Overlaps another box enough to look like a duplicate (see CanvasView.update_overlap_flags)
+        self.flagged = False
+        self._press_pos = None
+
+    # --- Text ---
+
+    def text(self):
+        return self._text
+
+    def set_text(self, text):
+        self.label_font()
+        self.prepareGeometryChange()
+        self._text = text
+        self._label.setText(text)
+        self._label.prepare(font=self._font)
+        self._label_rect = QRectF(0, 0, self._metrics.horizontalAdvance(text), self._metrics.height())
+        self.update_bounds()
+        self.update()
+
+    def label_pos(self):
+        return self.rect().topLeft() + self.LABEL_OFFSET
+
+    # --- Mode ---
+
+    @property
+    def current_mode(self):
+        """The mode lives on the canvas; boxes look it up when they need it"""
+        scene = self.scene()
+        if scene is not None:
+            for view in scene.views():
+                if hasattr(view, 'current_mode_ref'):
+                    return view.current_mode_ref
+        return "VIEW"
+
+    def update_handles(self):
+        """Creates the handles when this box is selected in RESIZE mode, drops them otherwise"""
+        want = self.isSelected() and self.current_mode == 'RESIZE'
+        if want and not self.handles:
+            self.create_handles()
+        elif not want and self.handles and not self.resizing:
+            for h in self.handles.values():
+                h.setParentItem(None)
+                if h.scene() is not None:
+                    h.scene().removeItem(h)
+            self.handles = {}
 
     def create_handles(self):
         # Top-Left, Top-Right, Bottom-Left, Bottom-Right
@@ -69,82 +138,121 @@ class BoxItem(QGraphicsRectItem):
         self.handles['tr'] = HandleItem(Qt.CursorShape.SizeBDiagCursor, self)
         self.handles['bl'] = HandleItem(Qt.CursorShape.SizeBDiagCursor, self)
         self.handles['br'] = HandleItem(Qt.CursorShape.SizeFDiagCursor, self)
-        self.set_handles_visible(False)
+        self.update_handles_pos()
 
     def update_handles_pos(self):
         """Moves handles to the current corners of the rect"""
+        if not self.handles: return
         r = self.rect()
         self.handles['tl'].setPos(r.topLeft())
         self.handles['tr'].setPos(r.topRight())
         self.handles['bl'].setPos(r.bottomLeft())
         self.handles['br'].setPos(r.bottomRight())
 
-    def update_text_pos(self):
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.GraphicsItemChange.ItemSelectedHasChanged:
+            self.update_handles()
+        return super().itemChange(change, value)
+
+    def hoverEnterEvent(self, event):
+        self.setCursor(self.CURSORS.get(self.current_mode, Qt.CursorShape.ArrowCursor))
+        super().hoverEnterEvent(event)
+
+    # --- Painting ---
+
+    def set_flagged(self, flagged):
+        if flagged != self.flagged:
+            self.flagged = flagged
+            self.update()
+
+    def update_bounds(self):
+        """Caches boundingRect(); call (after prepareGeometryChange) whenever rect or text change"""
         r = self.rect()
-        self.text_item.setPos(r.left(), r.top() - 25)
-
-    def set_handles_visible(self, visible):
-        for h in self.handles.values():
-            h.setVisible(visible)
-
-    def set_mode(self, mode):
-        self.current_mode = mode
-        
-        if mode == 'MOVE':
-            self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
-            self.set_handles_visible(False)
-            self.setCursor(Qt.CursorShape.OpenHandCursor)
-            
-        elif mode == 'RESIZE':
-            self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, False)
-            self.set_handles_visible(True) # Force show handles
-            self.setCursor(Qt.CursorShape.ArrowCursor)
-            # Ensure handles are in the right place when switching modes
-            self.update_handles_pos() 
-            
-        elif mode == 'TEXT':
-            self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, False)
-            self.set_handles_visible(False)
-            self.setCursor(Qt.CursorShape.IBeamCursor)
-            
-        else: # VIEW
-            self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, False)
-            self.set_handles_visible(False)
-            self.setCursor(Qt.CursorShape.ArrowCursor)
+        half_pen = self.SELECTED_PEN.widthF() / 2
+        self._bounds = r.adjusted(-half_pen, -half_pen, half_pen, half_pen).united(
+            self._label_rect.translated(self.label_pos()))
+
+    def boundingRect(self):
+        # The label sits above the box, outside rect(). Qt asks for this many
+        # times per frame, so it is only recomputed when the geometry changes
+        return self._bounds
 
     def paint(self, painter, option, widget):
         # Custom paint to handle selection color
         if self.isSelected():
-            self.setPen(self.selected_pen)
+            pen = self.SELECTED_PEN
+        elif self.flagged:
+            pen = self.FLAGGED_PEN
         else:
-            self.setPen(self.default_pen)
-        super().paint(painter, option, widget)
+            pen = self.DEFAULT_PEN
+
+        # Axis-aligned edges gain nothing from antialiasing, which is most of the cost here
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRect(self.rect())
+
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if lod >= self.LABEL_MIN_LOD and self._text:
+            painter.setFont(self._font)
+            painter.setPen(self.LABEL_COLOR)
+            painter.drawStaticText(self.label_pos(), self._label)
+
+    # --- Events ---
 
     def mouseDoubleClickEvent(self, event):
         if self.current_mode == 'TEXT':
-            old_text = self.text_item.toPlainText()
+            old_text = self.text()
             new_text, ok = QInputDialog.getText(None, "Edit Text", "Value:", text=old_text)
             if ok:
-                self.text_item.setPlainText(new_text)
+                self.set_text(new_text)
+                self.text_edited = True
         else:
             super().mouseDoubleClickEvent(event)
 
+    def mousePressEvent(self, event):
+        self._press_pos = self.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.current_mode == 'MOVE':
+            super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        if self._press_pos is not None and self.pos() != self._press_pos:
+            self.notify_geometry_changed()
+        self._press_pos = None
+
+    def bbox(self):
+        """[x1, y1, x2, y2] in scene (image) coordinates, including any move"""
+        r = self.mapRectToScene(self.rect())
+        return [r.left(), r.top(), r.right(), r.bottom()]
+
+    def notify_geometry_changed(self):
+        """Tells the views this box was moved/resized so its text can be re-read"""
+        scene = self.scene()
+        if scene is None: return
+        for view in scene.views():
+            if hasattr(view, 'on_box_changed'):
+                view.on_box_changed(self)
+
     # --- Resizing Logic ---
-    
+
     def start_resize(self, handle, mouse_pos):
         self.resizing = True
         self.current_handle = handle
 
     def perform_resize(self, handle, mouse_pos):
         if not self.resizing: return
-        
+
         # Convert mouse scene position to local item position
         local_pos = self.mapFromScene(mouse_pos)
         x, y = local_pos.x(), local_pos.y()
-        
+
         r = self.rect()
         left, top, right, bottom = r.left(), r.top(), r.right(), r.bottom()
-        
+
         # Modify specific coordinate based on handle
         if handle == self.handles['tl']:
             left, top = x, y
@@ -154,7 +262,7 @@ class BoxItem(QGraphicsRectItem):
             left, bottom = x, y
         elif handle == self.handles['br']:
             right, bottom = x, y
-            
+
         # --- FIX: Prevent Zero Size / Negative Size ---
         # Ensure Left is always smaller than Right by MIN_SIZE
         if left > right - self.MIN_SIZE:
@@ -162,7 +270,7 @@ class BoxItem(QGraphicsRectItem):
                 left = right - self.MIN_SIZE
             else:
                 right = left + self.MIN_SIZE
-                
+
         # Ensure Top is always smaller than Bottom by MIN_SIZE
         if top > bottom - self.MIN_SIZE:
             if handle in [self.handles['tl'], self.handles['tr']]:
@@ -170,13 +278,18 @@ class BoxItem(QGraphicsRectItem):
             else:
                 bottom = top + self.MIN_SIZE
 
-        # Update Rect
+        # Update Rect (the label moves with it in paint())
+        self.prepareGeometryChange()
         self.setRect(QRectF(left, top, right - left, bottom - top))
-        
+        self.update_bounds()
+
         # Important: Update visuals
         self.update_handles_pos()
-        self.update_text_pos()
 
     def end_resize(self):
+        was_resizing = self.resizing
         self.resizing = False
-        self.current_handle = None
\ No newline at end of file
+        self.current_handle = None
+        self.update_handles()
+        if was_resizing:
+            self.notify_geometry_changed()
@@ -1,14 +1,35 @@
 # ui/canvas.py
 from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsRectItem
-from PyQt6.QtCore import Qt, QRectF, QPointF
+from PyQt6.QtCore import Qt, QRectF, QPointF, pyqtSignal
 from PyQt6.QtGui import QPainter, QWheelEvent, QMouseEvent, QPen, QColor
 from .box_item import BoxItem
+from .tiled_image import TiledImageItem, TileWorker, page_size
+from .workers import start_worker
+from backend.config import ProjectConfig
+from backend.spatial_index import BoxIndex
 
 class CanvasView(QGraphicsView):
+    # BoxItems the user created, moved or resized (see MainWindow.queue_recognition)
+    boxes_changed = pyqtSignal(list)
+    # The page's tiles could not be decoded
+    page_failed = pyqtSignal(str)
+
+    # Zoomed out below this the BoxItems are hidden and drawForeground draws
+    # every visible box as a hairline in one call
+    SIMPLE_ZOOM = 0.2
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
+        # Every BoxItem on the scene, by its bbox; kept in sync by add/remove_box and on_box_changed
+        self.index = BoxIndex()
+        self._simplified = False
+
+        # Page background (see ui/tiled_image.py). Tile threads are kept here
+        # until they have stopped, or Python would delete them mid-run
+        self.page_item = None
+        self._page_threads = {}
         
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
         self.setDragMode(QGraphicsView.DragMode.NoDrag)
@@ -22,7 +43,8 @@ class CanvasView(QGraphicsView):
         self._draw_start = None
         self._ghost_rect = None # The visual rectangle while dragging
         
-        # Mode reference (needed to know if we should draw or pan)
+        # Mode reference (needed to know if we should draw or pan). Boxes read
+        # it from here instead of each keeping a copy, see set_mode
         self.current_mode_ref = "VIEW" 
 
     def wheelEvent(self, event: QWheelEvent):
@@ -35,6 +57,38 @@ class CanvasView(QGraphicsView):
         else:
             super().wheelEvent(event)
 
+    # --- Level of detail ---
+    def scale(self, sx, sy):
+        super().scale(sx, sy)
+        self.update_detail()
+
+    def resetTransform(self):
+        super().resetTransform()
+        self.update_detail()
+
+    def update_detail(self):
+        """Switches between per-item painting and drawForeground's batched boxes"""
+        simplified = self.transform().m11() < self.SIMPLE_ZOOM
+        if simplified == self._simplified:
+            return
+        self._simplified = simplified
+        for box in self.index:
+            box.setVisible(not simplified)
+        self.viewport().update()
+
+    def drawForeground(self, painter, rect):
+        super().drawForeground(painter, rect)
+        if not self._simplified:
+            return
+        normal, flagged = [], []
+        for box in self.index.query((rect.left(), rect.top(), rect.right(), rect.bottom())):
+            (flagged if box.flagged else normal).append(box.mapRectToScene(box.rect()))
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        for rects, pen in ((normal, BoxItem.DEFAULT_PEN), (flagged, BoxItem.FLAGGED_PEN)):
+            if rects:
+                painter.setPen(QPen(pen.color(), 0)) # Cosmetic hairline
+                painter.drawRects(rects)
+
     def mousePressEvent(self, event: QMouseEvent):
         # 1. Pan (Middle Click)
         if event.button() == Qt.MouseButton.MiddleButton:
@@ -106,13 +160,98 @@ class CanvasView(QGraphicsView):
             
             if rect.width() > 5 and rect.height() > 5:
                 new_box = BoxItem(rect.x(), rect.y(), rect.width(), rect.height(), "New Text")
-                
-                # APPLY CURRENT MODE TO NEW BOX
-                new_box.set_mode(self.current_mode_ref) 
-                
-                self.scene.addItem(new_box)
+                self.add_box(new_box)
+                self.refresh_overlap_flags([new_box, *self.index.overlapping(new_box)])
+                self.boxes_changed.emit([new_box])
             
             event.accept()
             return
 
-        super().mouseReleaseEvent(event)
\ No newline at end of file
+        super().mouseReleaseEvent(event)
+
+    def set_mode(self, mode):
+        self.current_mode_ref = mode
+        # Only the selected boxes have handles to add or drop
+        for item in self.scene.selectedItems():
+            if isinstance(item, BoxItem):
+                item.update_handles()
+
+    # --- Boxes ---
+    def boxes(self):
+        return list(self.index)
+
+    def add_box(self, box):
+        box.setVisible(not self._simplified)
+        self.scene.addItem(box)
+        self.index.insert(box, box.bbox())
+
+    def remove_box(self, box):
+        neighbours = self.index.overlapping(box)
+        self.scene.removeItem(box)
+        self.index.remove(box)
+        self.refresh_overlap_flags(neighbours)
+
+    def clear_boxes(self):
+        for box in self.boxes():
+            self.scene.removeItem(box)
+        self.index.clear()
+
+    def clear(self):
+        """Removes everything, page included"""
+        self.stop_page()
+        self.scene.clear()
+        self.index.clear()
+
+    # --- Page ---
+    def set_page(self, path):
+        """
+        Replaces the scene with a tiled view of the image at path. Only the
+        header is read here; tiles are decoded in the background as they come
+        into view. Returns (width, height).
+        """
+        width, height = page_size(path)
+        self.clear()
+
+        worker = TileWorker(path, TiledImageItem.TILE_SIZE)
+        worker.failed.connect(self.page_failed)
+        self.page_item = TiledImageItem(worker, width, height)
+        self.scene.addItem(self.page_item)
+        self.scene.setSceneRect(0, 0, width, height)
+
+        thread = start_worker(worker)
+        self._page_threads[thread] = worker
+        thread.finished.connect(lambda: self._page_threads.pop(thread, None))
+        return width, height
+
+    def stop_page(self, wait=False):
+        """Stops the current page's tile thread (waiting for every tile thread if asked)"""
+        if self.page_item is not None:
+            self.page_item.worker.stop()
+            self.page_item = None
+        if wait:
+            for thread in list(self._page_threads):
+                # finished -> quit is queued to this (blocked) thread, so quit directly
+                thread.quit()
+                thread.wait()
+
+    def update_overlap_flags(self):
+        """Flags boxes that overlap another one (likely duplicate detections). Returns how many"""
+        flagged = set()
+        for a, b, _ in self.index.overlapping_pairs(ProjectConfig.DUPLICATE_IOU):
+            flagged.update((a, b))
+        for box in self.index:
+            box.set_flagged(box in flagged)
+        return len(flagged)
+
+    def refresh_overlap_flags(self, boxes):
+        """Re-checks the flags of just these boxes, e.g. an edited box and its old and new neighbours"""
+        for box in set(boxes):
+            if box in self.index:
+                box.set_flagged(bool(self.index.overlapping(box, ProjectConfig.DUPLICATE_IOU)))
+
+    def on_box_changed(self, box):
+        """Called by BoxItem after a move or resize"""
+        before = self.index.overlapping(box)
+        self.index.update(box, box.bbox())
+        self.refresh_overlap_flags([box, *before, *self.index.overlapping(box)])
+        self.boxes_changed.emit([box])
\ No newline at end of file
@@ -1,27 +1,76 @@
 # ui/main_window.py
 import os
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QFileDialog, QLabel, QStatusBar, QMessageBox, QApplication)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QPixmap
+                             QPushButton, QFileDialog, QLabel, QStatusBar, QMessageBox, QSlider)
+from PyQt6.QtCore import Qt, QSettings, QTimer
 
 from .canvas import CanvasView
 from .box_item import BoxItem
+from .workers import ModelLoadWorker, OCRWorker, RecognizeWorker, start_worker
+from backend.annotation_index import AnnotationIndex, load_annotations
+from backend.cache import CropCache, ResultCache
+from backend.config import ModelConfig
+from backend.metrics import Profiler
 from backend.model_wrapper import OCREngine
+from backend.service import RemoteOCREngine
 from backend.exporter import save_to_voc_xml, save_to_yolo
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, service_url=None):
         super().__init__()
         self.setWindowTitle("Auto-OCR Annotation Tool")
         self.resize(1200, 800)
 
-        # Logic Engine
-        self.engine = OCREngine()
+        # Logic Engine: in-process, or a shared OCR service (cli.py serve) holding the models
+        self.remote = bool(service_url)
+        if self.remote:
+            self.engine = RemoteOCREngine(service_url)
+        else:
+            self.engine = OCREngine()
+            # Pressing Run OCR again on an unchanged page is answered from disk
+            self.engine.result_cache = ResultCache()
+            # Labels repeated on every page of a form are read once
+            self.engine.crop_cache = CropCache()
+        # Stage timings of the last run, summarised in the status bar
+        self.engine.profiler = Profiler()
+        # Saved boxes of every page, so re-opening one restores them at once
+        self.annotation_index = AnnotationIndex()
         self.current_image_path = None
         self.current_mode = "VIEW" 
 
+        # Background OCR (see ui/workers.py)
+        self.ocr_thread = None
+        self.ocr_worker = None
+        self.load_thread = None
+        self.load_worker = None
+        self.recognize_thread = None
+        self.recognize_worker = None
+
+        # Result id -> BoxItem of the boxes on the canvas, for streamed texts
+        self.ocr_boxes = {}
+        # Page whose boxes on the canvas came from OCR, so threshold changes re-run it
+        self.ocr_page = None
+
+        # Threshold slider moves, applied once the slider rests
+        self.threshold_timer = QTimer(self)
+        self.threshold_timer.setSingleShot(True)
+        self.threshold_timer.setInterval(150)
+        self.threshold_timer.timeout.connect(self.apply_thresholds)
+
+        # Boxes waiting to be re-read, flushed in one batch after a short pause
+        self.pending_boxes = {}
+        self.recognize_timer = QTimer(self)
+        self.recognize_timer.setSingleShot(True)
+        self.recognize_timer.setInterval(300)
+        self.recognize_timer.timeout.connect(self.flush_recognition)
+
+        # Remembers the last model paths between sessions
+        self.settings = QSettings("AutoOCR", "AutoAnnotator")
+
         self.setup_ui()
+
+        # Reload the previous session's models once the window is up
+        QTimer.singleShot(0, self.restore_models)
         
     def setup_ui(self):
         # Main Layout
@@ -38,6 +87,8 @@ class MainWindow(QMainWindow):
         self.btn_load_crnn = QPushButton("Load CRNN")
         self.btn_open_img = QPushButton("Open Image")
         self.btn_run_ocr = QPushButton("Run OCR")
+        self.btn_cancel_ocr = QPushButton("Cancel")
+        self.btn_cancel_ocr.setEnabled(False)
         self.btn_save = QPushButton("Save")
         
         # Connect Buttons
@@ -45,6 +96,7 @@ class MainWindow(QMainWindow):
         self.btn_load_crnn.clicked.connect(self.load_crnn)
         self.btn_open_img.clicked.connect(self.open_image)
         self.btn_run_ocr.clicked.connect(self.run_ocr)
+        self.btn_cancel_ocr.clicked.connect(self.cancel_ocr)
         self.btn_save.clicked.connect(self.save_data)
 
         toolbar.addWidget(self.btn_load_yolo)
@@ -52,8 +104,20 @@ class MainWindow(QMainWindow):
         toolbar.addSpacing(20)
         toolbar.addWidget(self.btn_open_img)
         toolbar.addWidget(self.btn_run_ocr)
+        toolbar.addWidget(self.btn_cancel_ocr)
         toolbar.addSpacing(20)
         toolbar.addWidget(self.btn_save)
+        toolbar.addSpacing(20)
+
+        # Detection thresholds, in hundredths; changing them re-filters the page
+        self.lbl_conf = QLabel()
+        self.lbl_iou = QLabel()
+        self.slider_conf = self.threshold_slider(
+            "conf", ModelConfig.YOLO_CONF, int(ModelConfig.YOLO_CANDIDATE_CONF * 100), self.lbl_conf, "Conf")
+        self.slider_iou = self.threshold_slider("iou", ModelConfig.YOLO_IOU, 10, self.lbl_iou, "IoU")
+        for label, slider in ((self.lbl_conf, self.slider_conf), (self.lbl_iou, self.slider_iou)):
+            toolbar.addWidget(label)
+            toolbar.addWidget(slider)
         toolbar.addStretch()
 
         # Mode Label
@@ -65,6 +129,8 @@ class MainWindow(QMainWindow):
 
         # 2. Canvas
         self.canvas = CanvasView()
+        self.canvas.boxes_changed.connect(self.queue_recognition)
+        self.canvas.page_failed.connect(lambda msg: self.status.showMessage(f"Error: {msg}"))
         main_layout.addWidget(self.canvas)
 
         # 3. Status Bar
@@ -72,6 +138,27 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.status)
         self.status.showMessage("Ready. Load models to begin.")
 
+    def threshold_slider(self, name, default, minimum, label, title):
+        slider = QSlider(Qt.Orientation.Horizontal)
+        slider.setRange(minimum, 95)
+        slider.setFixedWidth(100)
+        slider.setValue(round(self.settings.value(name, default, float) * 100))
+        label.setText(f"{title} {slider.value() / 100:.2f}")
+
+        def on_change(value):
+            label.setText(f"{title} {value / 100:.2f}")
+            self.settings.setValue(name, value / 100)
+            self.threshold_timer.start() # Restart: wait for the slider to rest
+        slider.valueChanged.connect(on_change)
+        return slider
+
+    def thresholds(self):
+        return self.slider_conf.value() / 100, self.slider_iou.value() / 100
+
+    def closeEvent(self, event):
+        self.canvas.stop_page(wait=True)
+        super().closeEvent(event)
+
     # --- Key Events ---
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_M:
@@ -82,12 +169,14 @@ class MainWindow(QMainWindow):
             self.set_mode("TEXT")   # New Text Mode
         elif event.key() == Qt.Key.Key_Delete:
             self.delete_selected()
+        elif event.key() == Qt.Key.Key_Escape:
+            self.cancel_ocr()
         else:
             super().keyPressEvent(event)
 
     def set_mode(self, mode):
         self.current_mode = mode
-        self.canvas.current_mode_ref = mode # Inform canvas
+        self.canvas.set_mode(mode) # Boxes read the mode from the canvas
         
         # Update UI Label
         mode_desc = {
@@ -97,62 +186,280 @@ class MainWindow(QMainWindow):
             "VIEW": "VIEW (Read only)"
         }
         self.lbl_mode.setText(f"Mode: {mode_desc.get(mode, mode)}")
-        
-        # Update all items in scene
-        for item in self.canvas.scene.items():
-            if isinstance(item, BoxItem):
-                item.set_mode(mode)
 
     # --- Actions ---
     def load_yolo(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Select YOLO Model", "", "Model Files (*.pt *.onnx)")
+        start_dir = os.path.dirname(self.settings.value("yolo_path", "", str))
+        path, _ = QFileDialog.getOpenFileName(self, "Select YOLO Model", start_dir, "Model Files (*.pt *.onnx)")
         if path:
-            success, msg = self.engine.load_yolo(path)
-            self.status.showMessage(msg)
+            self.start_model_load(yolo_path=path)
 
     def load_crnn(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Select CRNN Checkpoint", "", "Checkpoint Files (*.pth *.pt *.onnx)")
+        start_dir = os.path.dirname(self.settings.value("crnn_path", "", str))
+        path, _ = QFileDialog.getOpenFileName(self, "Select CRNN Checkpoint", start_dir, "Checkpoint Files (*.pth *.pt *.onnx)")
         if path:
-            success, msg = self.engine.load_crnn(path)
-            self.status.showMessage(msg)
+            self.start_model_load(crnn_path=path)
+
+    def restore_models(self):
+        if self.remote:
+            # No models to load: warm-up asks the service which ones it serves
+            self.btn_load_yolo.hide()
+            self.btn_load_crnn.hide()
+            # The service detects with its own thresholds
+            for widget in (self.lbl_conf, self.slider_conf, self.lbl_iou, self.slider_iou):
+                widget.hide()
+            self.start_model_load()
+            return
+        yolo_path = self.settings.value("yolo_path", "", str)
+        crnn_path = self.settings.value("crnn_path", "", str)
+        yolo_path = yolo_path if os.path.exists(yolo_path) else None
+        crnn_path = crnn_path if os.path.exists(crnn_path) else None
+        if yolo_path or crnn_path:
+            self.start_model_load(yolo_path, crnn_path)
+
+    def engine_busy(self):
+        """The engine is not re-entrant: one background job at a time"""
+        return any(t is not None for t in (self.ocr_thread, self.load_thread, self.recognize_thread))
+
+    def start_model_load(self, yolo_path=None, crnn_path=None):
+        """Loads models in the background; paths that load fine are remembered"""
+        if self.engine_busy():
+            return
+
+        self.set_models_loading(True)
+        self.load_worker = ModelLoadWorker(self.engine, yolo_path, crnn_path)
+        self.load_worker.progress.connect(self.status.showMessage)
+        self.load_worker.finished.connect(self.on_models_loaded)
+        self.load_worker.failed.connect(self.on_models_failed)
+        self.load_thread = start_worker(self.load_worker)
+        self.load_thread.finished.connect(self.on_load_thread_done)
+
+    def set_models_loading(self, loading):
+        self.btn_load_yolo.setEnabled(not loading)
+        self.btn_load_crnn.setEnabled(not loading)
+        self.btn_run_ocr.setEnabled(not loading)
+
+    def on_models_loaded(self, message):
+        self.set_models_loading(False)
+        worker = self.load_worker
+        if worker.yolo_path:
+            self.settings.setValue("yolo_path", worker.yolo_path)
+        if worker.crnn_path:
+            self.settings.setValue("crnn_path", worker.crnn_path)
+        if self.remote:
+            message = f"Using {self.engine.describe()}"
+        self.status.showMessage(message)
+
+    def on_models_failed(self, message):
+        self.set_models_loading(False)
+        self.status.showMessage(f"Error: {message}")
+        print(message)
+
+    def on_load_thread_done(self):
+        self.load_worker = None
+        self.load_thread = None
 
     def open_image(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select Image", "", "Images (*.png *.jpg *.jpeg)")
         if path:
+            self.cancel_ocr() # Results for the old page are no longer wanted
+            self.pending_boxes.clear()
             self.current_image_path = path
-            self.canvas.scene.clear()
-            pixmap = QPixmap(path)
-            self.canvas.scene.addPixmap(pixmap)
-            self.canvas.scene.setSceneRect(0, 0, pixmap.width(), pixmap.height())
-            self.status.showMessage(f"Loaded {os.path.basename(path)}")
+            self.ocr_page = None
+            if not self.remote:
+                # The file may have changed since the engine last read it
+                self.engine.forget_page(path)
+            try:
+                width, height = self.canvas.set_page(path)
+            except Exception as e:
+                self.status.showMessage(f"Error: {e}")
+                return
+            message = f"Loaded {os.path.basename(path)} ({width}x{height})"
+            try:
+                saved = load_annotations(self.annotation_index, path, (width, height))
+            except Exception as e:
+                saved, message = None, f"{message}; could not read its labels: {e}"
+            if saved:
+                self.show_boxes(saved)
+                message += f", {len(saved)} saved boxes"
+            self.status.showMessage(message)
 
     def run_ocr(self):
-        if not self.current_image_path:
+        if not self.current_image_path or self.engine_busy():
             return
         
         self.status.showMessage("Running OCR...")
-        QApplication.processEvents()
-        
-        try:
-            results = self.engine.run(self.current_image_path)
-            
-            # Remove existing boxes
-            for item in self.canvas.scene.items():
-                if isinstance(item, BoxItem):
-                    self.canvas.scene.removeItem(item)
-
-            # Add new boxes
-            for res in results:
-                x1, y1, x2, y2 = res['bbox']
-                box = BoxItem(x1, y1, x2-x1, y2-y1, res['text'])
-                box.set_mode(self.current_mode)
-                self.canvas.scene.addItem(box)
-                
-            self.status.showMessage(f"Found {len(results)} words.")
-            
-        except Exception as e:
-            self.status.showMessage(f"Error: {str(e)}")
-            print(e)
+        self.set_ocr_running(True)
+        if not self.remote:
+            # Safe while no worker is using the engine
+            self.engine.conf, self.engine.iou = self.thresholds()
+
+        self.ocr_worker = OCRWorker(self.engine, self.current_image_path)
+        self.ocr_worker.progress.connect(self.status.showMessage)
+        self.ocr_worker.boxes_ready.connect(self.on_ocr_boxes)
+        self.ocr_worker.texts_ready.connect(self.on_ocr_texts)
+        self.ocr_worker.finished.connect(self.on_ocr_finished)
+        self.ocr_worker.failed.connect(self.on_ocr_failed)
+        self.ocr_worker.cancelled.connect(self.on_ocr_cancelled)
+        self.ocr_thread = start_worker(self.ocr_worker)
+        self.ocr_thread.finished.connect(self.on_ocr_thread_done)
+
+    def cancel_ocr(self):
+        if self.ocr_worker is not None:
+            self.ocr_worker.cancel()
+            self.status.showMessage("Cancelling OCR...")
+
+    def apply_thresholds(self):
+        """
+        Re-runs OCR on the current page with the slider thresholds. The engine
+        keeps the page's detector candidates and read texts, so this only
+        re-filters the boxes and reads the ones it had not seen.
+        """
+        if self.ocr_page is None or self.ocr_page != self.current_image_path:
+            return # Nothing detected on this page yet; the next run uses the new values
+        if self.ocr_worker is not None:
+            self.ocr_worker.cancel() # Its thresholds are out of date
+        if self.engine_busy():
+            self.threshold_timer.start() # Try again once the engine is free
+            return
+        self.run_ocr()
+
+    def set_ocr_running(self, running):
+        self.btn_run_ocr.setEnabled(not running)
+        self.btn_cancel_ocr.setEnabled(running)
+        # The engine is not re-entrant: no model swaps mid-run
+        self.btn_load_yolo.setEnabled(not running)
+        self.btn_load_crnn.setEnabled(not running)
+
+    def finish_ocr(self):
+        """Returns the finished worker's image path and re-enables the UI"""
+        self.set_ocr_running(False)
+        return self.ocr_worker.image_path
+
+    def on_ocr_thread_done(self):
+        # Only drop the references once the thread has really stopped
+        self.ocr_worker = None
+        self.ocr_thread = None
+
+    def on_ocr_boxes(self, results):
+        """Detection is done: draw the boxes now, their texts arrive in on_ocr_texts"""
+        if self.ocr_worker.image_path != self.current_image_path:
+            return
+        self.ocr_worker.streamed = True
+        self.ocr_page = self.current_image_path
+        flagged = self.show_boxes(results)
+        message = f"Found {len(results)} words, reading them..."
+        if flagged:
+            message += f" {flagged} overlapping boxes flagged."
+        self.status.showMessage(message)
+
+    def on_ocr_texts(self, updates):
+        if self.ocr_worker.image_path != self.current_image_path:
+            return
+        self.set_box_texts(updates)
+
+    def set_box_texts(self, updates):
+        """Fills in [(id, text), ...] from OCR, leaving deleted and hand-edited boxes alone"""
+        for box_id, text in updates:
+            box = self.ocr_boxes.get(box_id)
+            if box is not None and box.scene() is self.canvas.scene and not box.text_edited:
+                box.set_text(text)
+
+    def on_ocr_finished(self, results):
+        streamed = getattr(self.ocr_worker, 'streamed', False)
+        image_path = self.finish_ocr()
+        if image_path != self.current_image_path:
+            return # Page changed while OCR was running
+
+        if streamed:
+            # The boxes are up already and may have been edited meanwhile
+            self.set_box_texts((res['id'], res['text']) for res in results)
+            flagged = self.canvas.update_overlap_flags()
+        else:
+            flagged = self.show_boxes(results)
+        self.ocr_page = image_path
+        message = f"Found {len(results)} words."
+        if flagged:
+            message += f" {flagged} overlapping boxes flagged."
+        if self.engine.profiler.last is not None:
+            message += f"  [{self.engine.profiler.last.summary()}]"
+        self.status.showMessage(message)
+
+    def show_boxes(self, results):
+        """Replaces the boxes on the canvas. Returns how many were flagged as overlapping"""
+        # Remove existing boxes
+        self.pending_boxes.clear()
+        self.canvas.clear_boxes()
+
+        # Add new boxes
+        self.ocr_boxes = {}
+        for i, res in enumerate(results):
+            x1, y1, x2, y2 = res['bbox']
+            box = BoxItem(x1, y1, x2-x1, y2-y1, res['text'])
+            self.canvas.add_box(box)
+            self.ocr_boxes[res.get('id', i)] = box
+
+        return self.canvas.update_overlap_flags()
+
+    def on_ocr_failed(self, message):
+        self.finish_ocr()
+        self.status.showMessage(f"Error: {message}")
+        print(message)
+
+    def on_ocr_cancelled(self):
+        self.finish_ocr()
+        self.status.showMessage("OCR cancelled.")
+
+    # --- Incremental re-recognition ---
+    def queue_recognition(self, boxes):
+        for box in boxes:
+            self.pending_boxes[box] = True
+        self.recognize_timer.start() # Restart: wait for the edits to settle
+
+    def flush_recognition(self):
+        if not self.pending_boxes or not self.current_image_path or self.engine.crnn_model is None:
+            return
+        if self.engine_busy():
+            self.recognize_timer.start() # Try again once the engine is free
+            return
+
+        boxes = [b for b in self.pending_boxes
+                 if b.scene() is self.canvas.scene and not b.text_edited]
+        self.pending_boxes.clear()
+        if not boxes:
+            return
+
+        # Remember the geometry we read, so boxes edited meanwhile are left alone
+        snapshot = [(box, box.bbox()) for box in boxes]
+        self.recognize_worker = RecognizeWorker(self.engine, self.current_image_path,
+                                                [bbox for _, bbox in snapshot])
+        self.recognize_worker.snapshot = snapshot
+        self.recognize_worker.finished.connect(self.on_recognize_finished)
+        self.recognize_worker.failed.connect(self.on_recognize_failed)
+        self.recognize_thread = start_worker(self.recognize_worker)
+        self.recognize_thread.finished.connect(self.on_recognize_thread_done)
+
+    def on_recognize_finished(self, texts):
+        worker = self.recognize_worker
+        if worker.image_path != self.current_image_path:
+            return
+
+        updated = 0
+        for (box, bbox), text in zip(worker.snapshot, texts):
+            if box.scene() is self.canvas.scene and box.bbox() == bbox and not box.text_edited:
+                box.set_text(text)
+                updated += 1
+        self.status.showMessage(f"Re-read {updated} boxes.")
+
+    def on_recognize_failed(self, message):
+        self.status.showMessage(f"Error: {message}")
+        print(message)
+
+    def on_recognize_thread_done(self):
+        self.recognize_worker = None
+        self.recognize_thread = None
+        if self.pending_boxes:
+            self.recognize_timer.start()
 
     def delete_selected(self):
         items = self.canvas.scene.selectedItems()
@@ -161,7 +468,7 @@ class MainWindow(QMainWindow):
         count = 0
         for item in items:
             if isinstance(item, BoxItem):
-                self.canvas.scene.removeItem(item)
+                self.canvas.remove_box(item)
                 count += 1
         self.status.showMessage(f"Deleted {count} boxes.")
 
@@ -169,13 +476,11 @@ class MainWindow(QMainWindow):
         if not self.current_image_path: return
         
         boxes = []
-        for item in self.canvas.scene.items():
-            if isinstance(item, BoxItem):
-                r = item.rect()
-                boxes.append({
-                    'bbox': [r.x(), r.y(), r.x() + r.width(), r.y() + r.height()],
-                    'text': item.text_item.toPlainText()
-                })
+        for item in self.canvas.boxes():
+            boxes.append({
+                'bbox': item.bbox(),
+                'text': item.text()
+            })
         
         if not boxes:
             self.status.showMessage("No boxes to save.")
@@ -194,5 +499,6 @@ class MainWindow(QMainWindow):
         
         save_to_yolo(boxes, img_size[0], img_size[1], yolo_path)
         save_to_voc_xml(boxes, base_name, img_size, xml_path)
+        self.annotation_index.record_save(self.current_image_path, img_size, boxes, xml_path)
         
         self.status.showMessage(f"Saved to {yolo_path} and {xml_path}")
\ No newline at end of file
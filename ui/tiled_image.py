@@ -0,0 +1,317 @@
+# ui/tiled_image.py
+"""
+Page background drawn from a tile pyramid instead of one full-size QPixmap.
+A TileWorker cuts tiles on a background thread: it keeps only the coarse
+pyramid levels decoded and spills the tiles of finer ones (full resolution
+included) to a temporary file, so panning reads tiles back instead of
+decoding the page again. TiledImageItem paints whichever tiles are
+visible at the current zoom and keeps a byte-capped LRU of them.
+"""
+import ctypes
+import math
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtWidgets import QGraphicsItem
+from PyQt6.QtCore import QObject, QRectF, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter, QPixmap
+
+def open_page(path):
+    """Lazily opens an image with PIL's decompression-bomb limit lifted: huge archival scans are the point"""
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = None
+    return Image.open(path)
+
+def page_size(path):
+    """(width, height) from the file header, without decoding the pixels"""
+    with open_page(path) as im:
+        return im.size
+
+def pyramid_levels(width, height, tile_size):
+    """Level 0 is full size, each next one half as big, down to a single tile"""
+    longest = max(width, height, 1)
+    return max(1, math.ceil(math.log2(longest / tile_size)) + 1) if longest > tile_size else 1
+
+def release_memory():
+    """
+    Hands freed heap back to the OS. glibc keeps what a worker thread freed
+    in that thread's arena, so after a full-page decode the process would
+    stay that big; other C libraries return large blocks by themselves.
+    """
+    try:
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+class TileWorker(QObject):
+    """
+    Serves tile requests on its own thread (see ui.workers.start_worker).
+    The newest requests are served first, since they are what is on screen
+    now; the oldest are dropped once too many pile up while scrolling.
+
+    Pyramid levels of at most LEVEL_CACHE_MB stay decoded; they are built
+    from one reduced decode of the page (JPEG decodes straight at the
+    reduced size), after which the full-resolution pixels are released.
+    A finer level is decoded once, the first time a tile of it is needed,
+    cut into tiles that go to an unlinked temporary file, and dropped; its
+    tiles are then read back from the file (the OS page cache, not this
+    process, holds the hot ones).
+    """
+    tile_ready = pyqtSignal(int, int, int, QImage) # level, col, row, image
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    MAX_PENDING = 256
+    LEVEL_CACHE_MB = 64
+
+    def __init__(self, path, tile_size):
+        super().__init__()
+        self.path = path
+        self.tile_size = tile_size
+        self._levels = {} # level -> PIL image, for the levels kept decoded
+        self._size = None # Full-resolution (width, height) and mode, from the header
+        self._spilled = {} # level -> {(col, row): (offset, width, height)} in _spill_file
+        self._spill_file = None
+        self._pending = OrderedDict()
+        self._wake = threading.Condition()
+        self._stop = False
+
+    def request(self, keys):
+        """Thread-safe. keys: iterable of (level, col, row)"""
+        with self._wake:
+            for key in keys:
+                self._pending[key] = True
+                self._pending.move_to_end(key)
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popitem(last=False)
+            self._wake.notify()
+
+    def stop(self):
+        """Thread-safe; run() returns after the tile in progress"""
+        with self._wake:
+            self._stop = True
+            self._wake.notify()
+
+    def _next(self):
+        with self._wake:
+            while not self._pending and not self._stop:
+                self._wake.wait()
+            if self._stop:
+                return None
+            return self._pending.popitem(last=True)[0]
+
+    def _header(self):
+        if self._size is None:
+            with open_page(self.path) as image:
+                # Grayscale scans stay 1 byte per pixel
+                self._size = image.size, "L" if image.mode in ("1", "L") else "RGB"
+        return self._size
+
+    def first_kept_level(self):
+        """Finest level small enough to stay decoded"""
+        (width, height), mode = self._header()
+        channels = 1 if mode == "L" else 3
+        k = 0
+        while math.ceil(width / (1 << k)) * math.ceil(height / (1 << k)) * channels > self.LEVEL_CACHE_MB * 1024 * 1024:
+            k += 1
+        return k
+
+    def decode(self, k):
+        """Level k straight from the file, at 1/2^k of the full size"""
+        (width, height), mode = self._header()
+        image = open_page(self.path)
+        if k:
+            # JPEG decodes at 1/2, 1/4 or 1/8 scale directly; other formats ignore this
+            image.draft(mode, (math.ceil(width / (1 << k)), math.ceil(height / (1 << k))))
+        if image.mode != mode:
+            image = image.convert(mode)
+        else:
+            image.load() # convert() would copy the pixels for nothing
+        done = max(0, round(math.log2(width / image.width)))
+        return image.reduce(1 << (k - done)) if k > done else image
+
+    def level(self, k):
+        """Level k of the pyramid: kept when small enough, else decoded for the caller to drop"""
+        first = self.first_kept_level()
+        if k < first:
+            return self.decode(k)
+        if not self._levels:
+            image = self.decode(first)
+            while True:
+                self._levels[first] = image
+                if max(image.size) <= self.tile_size:
+                    break
+                first, image = first + 1, image.reduce(2)
+        # Levels past the coarsest built one are single tiles of it
+        return self._levels[min(k, max(self._levels))]
+
+    def spill(self, k):
+        """Decodes level k once and writes all its tiles to the spill file"""
+        image = self.level(k)
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="tiles-")
+        f = self._spill_file
+        f.seek(0, 2)
+        s = self.tile_size
+        tiles = {}
+        for row in range(math.ceil(image.height / s)):
+            for col in range(math.ceil(image.width / s)):
+                tile = image.crop((col * s, row * s, min((col + 1) * s, image.width), min((row + 1) * s, image.height)))
+                tiles[col, row] = (f.tell(), tile.width, tile.height)
+                f.write(tile.tobytes())
+        self._spilled[k] = tiles
+        del image
+        release_memory()
+
+    def make_tile(self, level, col, row):
+        _, mode = self._header()
+        if level in self._spilled:
+            offset, width, height = self._spilled[level][col, row]
+            self._spill_file.seek(offset)
+            data = self._spill_file.read(width * height * (1 if mode == "L" else 3))
+        else:
+            image = self.level(level)
+            s = self.tile_size
+            tile = image.crop((col * s, row * s, min((col + 1) * s, image.width), min((row + 1) * s, image.height)))
+            data, width, height = tile.tobytes(), tile.width, tile.height
+        if mode == "L":
+            fmt, bytes_per_line = QImage.Format.Format_Grayscale8, width
+        else:
+            fmt, bytes_per_line = QImage.Format.Format_RGB888, width * 3
+        # copy(): the QImage must own its pixels once `data` is gone
+        return QImage(data, width, height, bytes_per_line, fmt).copy()
+
+    def run(self):
+        try:
+            while True:
+                key = self._next()
+                if key is None:
+                    break
+                if key[0] < self.first_kept_level() and key[0] not in self._spilled:
+                    self.spill(key[0])
+                self.tile_ready.emit(*key, self.make_tile(*key))
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            self._levels = {}
+            self._spilled = {}
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+        self.finished.emit()
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Scene item covering (0, 0, width, height) that paints the page from
+    TILE_SIZE tiles of the pyramid level matching the zoom. Tiles not loaded
+    yet are requested from the worker and stood in for by a coarser cached
+    level (or a flat fill) until they arrive.
+    """
+    TILE_SIZE = 512
+    CACHE_MB = 256
+    PLACEHOLDER = QColor("#3a3a3a")
+
+    def __init__(self, worker, width, height):
+        super().__init__()
+        self.worker = worker
+        self.width, self.height = width, height
+        self.num_levels = pyramid_levels(width, height, self.TILE_SIZE)
+        self._cache = OrderedDict() # (level, col, row) -> QPixmap
+        self._cache_bytes = 0
+
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.setZValue(-1) # Under the boxes
+        worker.tile_ready.connect(self.on_tile_ready)
+        # The single coarsest tile backs every fallback, so it comes first
+        worker.request([(self.num_levels - 1, 0, 0)])
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def tile_rect(self, level, col, row):
+        """Scene rect a tile covers"""
+        span = self.TILE_SIZE * (1 << level)
+        return QRectF(col * span, row * span, span, span).intersected(self.boundingRect())
+
+    def level_for(self, lod):
+        """Coarsest level still at least as sharp as the screen"""
+        if lod <= 0:
+            return self.num_levels - 1
+        return min(max(int(math.floor(math.log2(1 / lod))), 0), self.num_levels - 1)
+
+    def tiles_in(self, rect, level):
+        span = self.TILE_SIZE * (1 << level)
+        rect = rect.intersected(self.boundingRect())
+        if rect.isEmpty():
+            return []
+        c1, r1 = int(rect.left() // span), int(rect.top() // span)
+        c2, r2 = int(math.ceil(rect.right() / span)), int(math.ceil(rect.bottom() / span))
+        return [(level, c, r) for r in range(r1, r2) for c in range(c1, c2)]
+
+    # --- Cache ---
+
+    def cached(self, key):
+        pixmap = self._cache.get(key)
+        if pixmap is not None:
+            self._cache.move_to_end(key)
+        return pixmap
+
+    def on_tile_ready(self, level, col, row, image):
+        key = (level, col, row)
+        if key in self._cache:
+            return
+        pixmap = QPixmap.fromImage(image)
+        self._cache[key] = pixmap
+        self._cache_bytes += self._pixmap_bytes(pixmap)
+        while self._cache_bytes > self.CACHE_MB * 1024 * 1024 and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._cache_bytes -= self._pixmap_bytes(old)
+        self.update(self.tile_rect(*key))
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth() // 8, 1)
+
+    def cache_stats(self):
+        return {'tiles': len(self._cache), 'bytes': self._cache_bytes}
+
+    # --- Painting ---
+
+    def paint(self, painter, option, widget):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.level_for(lod)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
+
+        missing = []
+        for key in self.tiles_in(option.exposedRect, level):
+            target = self.tile_rect(*key)
+            pixmap = self.cached(key)
+            if pixmap is not None:
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+                continue
+            missing.append(key)
+            self.paint_fallback(painter, key, target)
+
+        # Re-sent on every paint: the worker drops duplicates and stale requests
+        if missing:
+            self.worker.request(missing)
+
+    def paint_fallback(self, painter, key, target):
+        """Upscales the part of a coarser cached tile covering `target`, or fills it flat"""
+        level, col, row = key
+        for coarse in range(level + 1, self.num_levels):
+            shift = coarse - level
+            parent = (coarse, col >> shift, row >> shift)
+            pixmap = self._cache.get(parent)
+            if pixmap is None:
+                continue
+            parent_rect = self.tile_rect(*parent)
+            scale = 1 / (1 << coarse)
+            source = QRectF((target.left() - parent_rect.left()) * scale,
+                            (target.top() - parent_rect.top()) * scale,
+                            target.width() * scale, target.height() * scale)
+            painter.drawPixmap(target, pixmap, source)
+            return
+        painter.fillRect(target, self.PLACEHOLDER)
@@ -0,0 +1,120 @@
+# ui/workers.py
+import threading
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+from backend.model_wrapper import OCRCancelled
+
+class OCRWorker(QObject):
+    """
+    Runs OCREngine.run off the UI thread. Results come back through signals:
+    boxes_ready once detection is done (texts still empty), texts_ready with
+    [(id, text), ...] after every CRNN batch, and finished with everything.
+    """
+    progress = pyqtSignal(str)
+    boxes_ready = pyqtSignal(list)
+    texts_ready = pyqtSignal(list)
+    finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, engine, image_path):
+        super().__init__()
+        self.engine = engine
+        self.image_path = image_path
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Thread-safe; the engine stops at its next checkpoint"""
+        self._cancel.set()
+
+    def _on_progress(self, stage, done, total):
+        if stage == 'detecting':
+            self.progress.emit("Detecting words...")
+        else:
+            self.progress.emit(f"Recognizing {done}/{total}...")
+
+    def run(self):
+        try:
+            results = self.engine.run(self.image_path, progress=self._on_progress,
+                                      should_cancel=self._cancel.is_set,
+                                      on_boxes=self.boxes_ready.emit, on_texts=self.texts_ready.emit)
+        except OCRCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(results)
+
+class RecognizeWorker(QObject):
+    """Re-reads a handful of boxes on the current page with the CRNN only"""
+    finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, engine, image_path, bboxes):
+        super().__init__()
+        self.engine = engine
+        self.image_path = image_path
+        self.bboxes = bboxes
+
+    def run(self):
+        try:
+            texts = self.engine.recognize_regions(self.image_path, self.bboxes)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.finished.emit(texts)
+
+class ModelLoadWorker(QObject):
+    """Loads YOLO and/or CRNN weights off the UI thread, then warms them up"""
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, engine, yolo_path=None, crnn_path=None, warm_up=True):
+        super().__init__()
+        self.engine = engine
+        self.yolo_path = yolo_path
+        self.crnn_path = crnn_path
+        self.warm_up = warm_up
+
+    def run(self):
+        messages = []
+        try:
+            for name, path, loader in (("YOLO", self.yolo_path, self.engine.load_yolo),
+                                       ("CRNN", self.crnn_path, self.engine.load_crnn)):
+                if not path:
+                    continue
+                self.progress.emit(f"Loading {name}...")
+                success, msg = loader(path)
+                if not success:
+                    self.failed.emit(f"{name}: {msg}")
+                    return
+                messages.append(msg)
+
+            if self.warm_up:
+                self.progress.emit("Warming up models...")
+                self.engine.warm_up()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(", ".join(messages))
+
+def start_worker(worker):
+    """
+    Moves a worker (a QObject with a run() slot and finished/failed/cancelled
+    signals) to a new QThread and starts it. The thread quits once any of
+    those signals fire. Returns the QThread; keep references to both it and
+    the worker until thread.finished, or Python will delete them mid-run.
+    """
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+
+    for name in ('finished', 'failed', 'cancelled'):
+        signal = getattr(worker, name, None)
+        if signal is not None:
+            signal.connect(thread.quit)
+
+    thread.start()
+    return thread